@@ -1,12 +1,21 @@
 import streamlit as st
 from vlm_pipeline import CCTVVLMPipeline
-import json
+from results_io import read_results
+import threading
 import pandas as pd
-import plotly.express as px
 from pathlib import Path
 
 st.set_page_config(page_title="CCTV RAG Pipeline", layout="wide")
 
+@st.cache_resource
+def get_pipeline():
+    """One pipeline per server: manifest, frame/result caches and checkpoints stay warm across reruns"""
+    return CCTVVLMPipeline()
+
+@st.cache_resource
+def get_run_lock():
+    return threading.Lock()
+
 st.title("🔍 CCTV RAG Agent Pipeline")
 st.markdown("**APSIT BE Project 2025-26**")
 
@@ -19,26 +28,31 @@ with col2:
 
 if st.button("🚀 RUN PIPELINE", type="primary", use_container_width=True):
     with st.spinner("Processing frames → chunks → JSON events..."):
-        pipeline = CCTVVLMPipeline()
-        results = pipeline.process_all_chunks(chunk_size=chunk_size, overlap_step=overlap)
+        with get_run_lock():
+            results = get_pipeline().process_all_chunks(chunk_size=chunk_size, overlap_step=overlap)
     
     # Results dashboard
-    st.success(f"✅ Pipeline complete! {results['stats']['chunks_processed']} events generated")
+    st.success(f"✅ Pipeline complete! {results['stats']['chunks_processed']} new events, "
+               f"{results['stats']['chunks_skipped']} windows already processed")
     
     col1, col2, col3 = st.columns(3)
     col1.metric("Chunks", results['stats']['chunks_processed'])
     col2.metric("BLEU-4", f"{results['stats']['avg_bleu']:.3f}")
-    col3.metric("VLM Calls Saved", "95%")
+    col3.metric("VLM Calls", results['stats']['vlm_calls'])
     
-    # Events table
-    df = pd.DataFrame(results['events'])
-    st.dataframe(df[['chunk_id', 'trigger', 'summary', 'bleu']].style.format({'bleu': '{:.3f}'}))
+    # Events of every run with these settings (only the columns shown are kept in memory)
+    columns = ['chunk_id', 'trigger', 'summary', 'bleu']
+    rows = [{c: r[c] for c in columns} for path in results['results_files']
+            for r in read_results(path) if r.get('type') == 'event']
+    df = pd.DataFrame(rows, columns=columns)
+    st.dataframe(df.style.format({'bleu': '{:.3f}'}))
     
     # Download
-    st.download_button(
-        "💾 Download ChromaDB JSON", 
-        json.dumps(results, indent=2, ensure_ascii=False),
-        f"cctv_rag_{results['timestamp']}.json"
-    )
+    if results['output_file']:
+        st.download_button(
+            "💾 Download ChromaDB JSONL", 
+            Path(results['output_file']).read_bytes(),
+            Path(results['output_file']).name
+        )
 
 st.info("📁 **Put JPG/PNG frames in `frames/` folder → Click RUN**")
@@ -0,0 +1,85 @@
+import json, time, hashlib, sqlite3, threading
+from pathlib import Path
+
+
+def config_key(**config):
+    """Everything that changes which windows exist or what they produce"""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def window_key(entries):
+    """Identity of a window: its frames' names, sizes and mtimes (a replaced frame makes a new window)"""
+    parts = [f"{e['name']}:{e['size']}:{e['mtime']}" for e in entries]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Records which sliding windows have been described, per pipeline config,
+    and which results file each run writes to. A run only processes windows
+    missing from the store; a run that never finished is resumed by appending
+    to its own results file. Stored in SQLite next to the results.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY, config TEXT NOT NULL, output_file TEXT NOT NULL,
+            started REAL NOT NULL, finished REAL)""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS windows (
+            config TEXT NOT NULL, window TEXT NOT NULL, start_frame TEXT NOT NULL, end_frame TEXT NOT NULL,
+            run_id INTEGER NOT NULL, chunk_id TEXT NOT NULL, done REAL NOT NULL,
+            PRIMARY KEY (config, window))""")
+        self.db.commit()
+
+    def done_windows(self, config):
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT window FROM windows WHERE config = ?", (config,))}
+
+    def unfinished_run(self, config):
+        """(run_id, output_file) of the latest interrupted run whose file still exists, or None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, output_file FROM runs WHERE config = ? AND finished IS NULL ORDER BY id DESC LIMIT 1",
+                (config,),
+            ).fetchone()
+        if row is None or not Path(row[1]).exists():
+            return None
+        return row
+
+    def start_run(self, config, output_file):
+        with self.lock:
+            run_id = self.db.execute(
+                "INSERT INTO runs (config, output_file, started) VALUES (?, ?, ?)",
+                (config, str(output_file), time.time()),
+            ).lastrowid
+            self.db.commit()
+        return run_id
+
+    def finish_run(self, run_id):
+        with self.lock:
+            self.db.execute("UPDATE runs SET finished = ? WHERE id = ?", (time.time(), run_id))
+            self.db.commit()
+
+    def mark_done(self, config, run_id, windows):
+        """windows: (window_key, start_frame, end_frame, chunk_id) tuples, committed together"""
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO windows (config, window, start_frame, end_frame, run_id, chunk_id, done) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(config, key, start, end, run_id, chunk_id, now) for key, start, end, chunk_id in windows],
+            )
+            self.db.commit()
+
+    def output_files(self, config):
+        """Results files of every run of this config, oldest first, that still exist"""
+        with self.lock:
+            rows = self.db.execute("SELECT output_file FROM runs WHERE config = ? ORDER BY id", (config,)).fetchall()
+        return [row[0] for row in rows if Path(row[0]).exists()]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,140 @@
+import re, json, math, argparse
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+from results_io import read_results
+
+# Same numbers as nltk's sentence_bleu/corpus_bleu with weights (0.25,)*4 and
+# SmoothingFunction().method1, without importing nltk or downloading anything.
+MAX_N = 4
+EPSILON = 0.1
+DEFAULT_REFERENCES = ["Person moving in server room"]
+
+
+def prediction_text(pred_json):
+    """The text scored against the captions: the JSON with punctuation stripped"""
+    return re.sub(r'[{}",:\[\]]', ' ', json.dumps(pred_json)).lower()
+
+
+def ngrams(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+class References:
+    """One key's reference captions, tokenized once: per-order max n-gram counts and lengths"""
+
+    def __init__(self, captions, max_n=MAX_N):
+        tokenized = [c.split() for c in captions]
+        self.lengths = sorted(len(t) for t in tokenized)
+        self.max_counts = []
+        for n in range(1, max_n + 1):
+            merged = Counter()
+            for tokens in tokenized:
+                for gram, count in ngrams(tokens, n).items():
+                    merged[gram] = max(merged[gram], count)
+            self.max_counts.append(merged)
+
+    def closest_length(self, hyp_len):
+        return min(self.lengths, key=lambda ref_len: (abs(ref_len - hyp_len), ref_len))
+
+
+class BLEUEvaluator:
+    """
+    Loads the ground-truth captions once and precomputes their n-gram counts.
+    `score_batch` turns (frame_name, prediction_text) pairs into one stats
+    matrix (clipped matches and totals per order, hypothesis and reference
+    length) and derives every sentence BLEU from it in one numpy pass; the
+    column sums of the same matrix give corpus BLEU.
+    """
+
+    def __init__(self, gt_captions=None, gt_path=None, max_n=MAX_N, epsilon=EPSILON):
+        if gt_captions is None:
+            gt_captions = {}
+            if gt_path:
+                with open(gt_path, 'r') as f:
+                    gt_captions = json.load(f)
+        self.max_n = max_n
+        self.epsilon = epsilon
+        self.references = {key: References(captions, max_n) for key, captions in gt_captions.items()}
+        self.default = References(DEFAULT_REFERENCES, max_n)
+
+    def captions_for(self, key):
+        return self.references.get(key, self.default)
+
+    def stats_row(self, key, text):
+        """[matches_1..n, totals_1..n, hyp_len, ref_len] for one prediction"""
+        refs = self.captions_for(key)
+        tokens = text.split()
+        row = [0] * (2 * self.max_n + 2)
+        for n in range(1, self.max_n + 1):
+            counts = ngrams(tokens, n)
+            max_counts = refs.max_counts[n - 1]
+            row[n - 1] = sum(min(count, max_counts[gram]) for gram, count in counts.items())
+            row[self.max_n + n - 1] = max(1, sum(counts.values()))
+        row[-2] = len(tokens)
+        row[-1] = refs.closest_length(len(tokens))
+        return row
+
+    def _stats_rows(self, items):
+        return [self.stats_row(key, text) for key, text in items]
+
+    def stats_matrix(self, items, processes=None):
+        items = list(items)
+        if processes and processes > 1 and len(items) >= 256:
+            size = math.ceil(len(items) / processes)
+            with Pool(processes) as pool:
+                parts = pool.map(self._stats_rows, [items[i:i + size] for i in range(0, len(items), size)])
+            rows = [row for part in parts for row in part]
+        else:
+            rows = self._stats_rows(items)
+        return np.array(rows, dtype=np.float64).reshape(-1, 2 * self.max_n + 2)
+
+    def bleu_from_stats(self, stats):
+        """Sentence BLEU for every row of a stats matrix (a 1-D row gives corpus BLEU)"""
+        stats = np.atleast_2d(stats)
+        matches, totals = stats[:, :self.max_n], stats[:, self.max_n:2 * self.max_n]
+        hyp_len, ref_len = stats[:, -2], stats[:, -1]
+
+        # method1: zero-match orders get epsilon matches instead
+        precision = np.where(matches > 0, matches, self.epsilon) / totals
+        score = np.exp(np.log(precision).mean(axis=1))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            penalty = np.where(hyp_len > ref_len, 1.0, np.exp(1 - ref_len / np.maximum(hyp_len, 1)))
+        penalty = np.where(hyp_len == 0, 0.0, penalty)
+        return np.where(matches[:, 0] == 0, 0.0, score * penalty)
+
+    def score_batch(self, items, processes=None):
+        """Returns (sentence BLEU array, stats matrix) for (key, prediction_text) pairs"""
+        stats = self.stats_matrix(items, processes)
+        return self.bleu_from_stats(stats), stats
+
+    def corpus_bleu(self, stats):
+        return float(self.bleu_from_stats(np.asarray(stats).sum(axis=0))[0]) if len(stats) else 0.0
+
+    def sentence_bleu(self, key, text):
+        return float(self.bleu_from_stats(np.array(self.stats_row(key, text), dtype=np.float64))[0])
+
+
+def evaluate_results(results_path, gt_path="gt_captions.json", processes=None):
+    """Re-scores a pipeline results file: mean sentence BLEU and corpus BLEU"""
+    evaluator = BLEUEvaluator(gt_path=gt_path)
+    items = [
+        (r["frame_names"][0], prediction_text(r["json"]))
+        for r in read_results(results_path) if r.get("type") == "event" and r.get("frame_names")
+    ]
+    scores, stats = evaluator.score_batch(items, processes)
+    return {
+        "events": len(items),
+        "avg_bleu": float(scores.mean()) if len(items) else 0.0,
+        "corpus_bleu": evaluator.corpus_bleu(stats),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BLEU-4 for a CCTV pipeline results file")
+    parser.add_argument("results")
+    parser.add_argument("--gt", default="gt_captions.json")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    print(json.dumps(evaluate_results(args.results, args.gt, args.processes), indent=2))
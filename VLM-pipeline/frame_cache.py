@@ -0,0 +1,71 @@
+import time, threading
+from collections import OrderedDict
+from PIL import Image
+
+
+class FrameCache:
+    """
+    Bounded LRU of prepared (decoded + resized) frames keyed by path and
+    target size, shared by every window of a run so overlapping windows
+    decode each frame once. JPEGs larger than the target use PIL's draft
+    mode, which lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly.
+    Pass the file's mtime as `version` so a replaced frame is decoded again.
+    Cached images are shared: treat them as read-only.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.draft_decodes = 0
+        self.decode_time = 0.0
+
+    def get(self, path, size=(512, 512), version=None):
+        key = (str(path), tuple(size), version)
+        with self.lock:
+            image = self.frames.get(key)
+            if image is not None:
+                self.frames.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        start = time.perf_counter()
+        image = self._prepare(path, size)
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.decode_time += elapsed
+            self.frames[key] = image
+            while len(self.frames) > self.capacity:
+                self.frames.popitem(last=False)
+                self.evictions += 1
+        return image
+
+    def _prepare(self, path, size):
+        with Image.open(path) as img:
+            if img.format == "JPEG" and img.width > size[0] and img.height > size[1]:
+                # Picks the smallest scale that is still >= size, then resize finishes the job
+                img.draft(img.mode, size)
+                self.draft_decodes += 1
+            return img.resize(size)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self.frames),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "draft_decodes": self.draft_decodes,
+                "decode_time_s": round(self.decode_time, 4),
+            }
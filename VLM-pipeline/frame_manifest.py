@@ -0,0 +1,126 @@
+import os, re, json, time
+from datetime import datetime
+from pathlib import Path
+
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MANIFEST_SUFFIX = ".manifest.json"
+
+# 20260122_170007, 20260122T170007123, 2026-01-22_17-00-07 ...
+DATETIME_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[_T-]?(\d{2})-?(\d{2})-?(\d{2})(?:[._-]?(\d{1,6}))?")
+# Unix seconds or milliseconds, e.g. cam1_1737545407.jpg
+EPOCH_PATTERN = re.compile(r"(?<!\d)(\d{10}|\d{13})(?!\d)")
+
+
+def parse_timestamp(name):
+    """Capture time encoded in a frame file name, as Unix seconds, or None"""
+    stem = Path(name).stem
+    match = DATETIME_PATTERN.search(stem)
+    if match:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        try:
+            dt = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+        except ValueError:
+            dt = None
+        if dt is not None:
+            return dt.timestamp() + (int(fraction) / 10 ** len(fraction) if fraction else 0.0)
+
+    match = EPOCH_PATTERN.search(stem)
+    if match:
+        value = int(match.group(1))
+        return value / 1000 if len(match.group(1)) == 13 else float(value)
+    return None
+
+
+class FrameManifest:
+    """
+    Sorted list of the frames in a directory with name, mtime, size and parsed
+    timestamp, persisted next to the frames directory as <dir>.manifest.json.
+    `refresh()` is one scandir pass that stats every frame (no globbing, no
+    decoding), so added, removed and replaced frames are all picked up; the
+    manifest is rewritten only when something changed. There is no shortcut
+    on the directory's mtime: overwriting a frame in place does not change it.
+    """
+
+    def __init__(self, frames_dir, manifest_path=None):
+        self.frames_dir = Path(frames_dir)
+        if manifest_path is None:
+            manifest_path = self.frames_dir.with_name(self.frames_dir.name + MANIFEST_SUFFIX)
+        self.manifest_path = Path(manifest_path)
+        self.entries = []
+        self.index = {}
+        self.replaced = 0
+        self._paths = None
+        self.load()
+
+    def load(self):
+        if not self.manifest_path.exists():
+            return
+        try:
+            with open(self.manifest_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return
+        self._set_entries(data.get("frames", []))
+
+    def save(self):
+        data = {"updated": time.time(), "frames": self.entries}
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            # Read-only archives still work, the manifest is just rebuilt next run
+            print(f"⚠️ Could not save manifest {self.manifest_path}: {e}")
+
+    def refresh(self):
+        """Picks up added, removed and replaced frames. Returns the number of new frames;
+        `replaced` holds how many known frames changed size or mtime."""
+        self.replaced = 0
+        if not self.frames_dir.is_dir():
+            self._set_entries([])
+            return 0
+
+        known = {e["name"]: e for e in self.entries}
+        entries, added = [], 0
+        with os.scandir(self.frames_dir) as it:
+            for item in it:
+                if not item.name.lower().endswith(FRAME_EXTENSIONS) or not item.is_file():
+                    continue
+                st = item.stat()
+                entry = known.pop(item.name, None)
+                if entry is None:
+                    entry = {"name": item.name, "mtime": st.st_mtime, "size": st.st_size,
+                             "timestamp": parse_timestamp(item.name)}
+                    added += 1
+                elif entry["mtime"] != st.st_mtime or entry["size"] != st.st_size:
+                    entry = {**entry, "mtime": st.st_mtime, "size": st.st_size}
+                    self.replaced += 1
+                entries.append(entry)
+
+        if added or self.replaced or known:
+            self._set_entries(sorted(entries, key=lambda e: e["name"]))
+            self.save()
+        return added
+
+    def _set_entries(self, entries):
+        self.entries = entries
+        self.index = {e["name"]: i for i, e in enumerate(entries)}
+        self._paths = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return self.entries[i]
+
+    def paths(self):
+        """Frame paths in order (cached until the manifest changes)"""
+        if self._paths is None:
+            self._paths = [self.frames_dir / e["name"] for e in self.entries]
+        return self._paths
+
+    def position(self, name):
+        """Index of a frame by file name, or None"""
+        return self.index.get(name)
@@ -0,0 +1,28 @@
+import json
+from pathlib import Path
+
+# Standard library only: chromadb-mistral imports this reader too
+
+
+def read_results(path):
+    """Yields the records of a results file in order: header, events, summary.
+    Reads .jsonl streams (stopping at a torn last line from a crashed run) and
+    converts old single-.json dumps to the same record shapes."""
+    path = Path(path)
+    if path.suffix == ".json":
+        with open(path, 'r') as f:
+            data = json.load(f)
+        events = data.pop("events", [])
+        stats = data.pop("stats", None)
+        yield {"type": "header", **data}
+        for event in events:
+            yield {"type": "event", **event}
+        yield {"type": "summary", "stats": stats}
+        return
+    
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                break
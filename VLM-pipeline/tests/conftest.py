@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Pipeline modules are flat and imported by name, as when running from VLM-pipeline/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
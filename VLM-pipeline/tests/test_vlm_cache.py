@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from vlm_cache import VLMResultCache, dhash
+from vlm_client import PROMPT_VERSION, prompt_context
+
+
+def scene(seed, noise=0):
+    rng = np.random.default_rng(seed)
+    pixels = np.kron(rng.integers(0, 256, (8, 8, 3)), np.ones((64, 64, 1))).astype(np.int16)
+    if noise:
+        pixels += np.random.default_rng(seed + 1).integers(-noise, noise + 1, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def chunk(start_x, frames, trigger="sliding_window"):
+    return {
+        "track_id": "person_47",
+        "timestamps": ["10:30:15", "10:30:18", "10:30:21"],
+        "positions": [[start_x + i * 70, 200, 80, 180] for i in range(3)],
+        "history": ["Person47 entered server room"],
+        "trigger": trigger,
+        "frames": frames,
+    }
+
+
+def key(c):
+    return VLMResultCache.context_key("stub", PROMPT_VERSION, prompt_context(c))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = VLMResultCache(tmp_path / "vlm_cache.sqlite")
+    yield cache
+    cache.close()
+
+
+def test_shifted_window_with_near_identical_frames_hits(cache):
+    first = chunk(100, [scene(i) for i in range(3)])
+    cache.put(key(first), [dhash(f) for f in first["frames"]], {"natural_summary": "walked to the door"})
+
+    # Same motion further along the corridor, frames re-encoded with a little noise
+    shifted = chunk(150, [scene(i, noise=3) for i in range(3)])
+    assert key(shifted) == key(first)
+    assert cache.get(key(shifted), [dhash(f) for f in shifted["frames"]]) == {"natural_summary": "walked to the door"}
+    assert cache.stats()["misses"] == 0
+
+
+def test_different_prompt_inputs_miss(cache):
+    first = chunk(100, [scene(i) for i in range(3)])
+    hashes = [dhash(f) for f in first["frames"]]
+    cache.put(key(first), hashes, {"natural_summary": "walked to the door"})
+
+    assert cache.get(key(chunk(100, first["frames"], trigger="track_birth")), hashes) is None
+    assert cache.get(key(first), [dhash(scene(i + 10)) for i in range(3)]) is None
@@ -0,0 +1,116 @@
+import json, time, hashlib, sqlite3, threading
+import numpy as np
+from PIL import Image
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail.
+    Near-identical frames (noise, compression, lighting flicker) differ by a few bits."""
+    small = np.asarray(image.convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class VLMResultCache:
+    """
+    Persistent, content-addressed cache of VLM JSON outputs.
+
+    Entries are grouped by a context key (model, prompt version and the
+    prompt's inputs other than timestamps) and matched on the perceptual hashes of the chunk's
+    frames: a window whose every frame is within `max_distance` bits of a
+    cached window's frame is served from cache. Stored in SQLite; once the
+    stored JSON exceeds `max_bytes`, least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, max_distance=6):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY, context TEXT NOT NULL, hashes TEXT NOT NULL,
+            result TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_context ON results (context)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def context_key(model_id, prompt_version, inputs):
+        """Everything besides the pixels that shapes the answer; `inputs` must be JSON-serializable"""
+        key = json.dumps([model_id, prompt_version, inputs])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def get(self, context, hashes):
+        """Cached JSON for the closest matching window, or None"""
+        with self.lock:
+            rows = self.db.execute("SELECT id, hashes, result FROM results WHERE context = ?", (context,)).fetchall()
+            best = None
+            for row_id, row_hashes, result in rows:
+                cached = [int(h, 16) for h in row_hashes.split(",")]
+                if len(cached) != len(hashes):
+                    continue
+                distance = max(hamming(a, b) for a, b in zip(cached, hashes))
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, row_id, result)
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            distance, row_id, result = best
+            if distance == 0:
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+            self.db.execute("UPDATE results SET last_used = ? WHERE id = ?", (time.time(), row_id))
+            self.db.commit()
+            return json.loads(result)
+
+    def put(self, context, hashes, result):
+        data = json.dumps(result, ensure_ascii=False)
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO results (context, hashes, result, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (context, ",".join(f"{h:016x}" for h in hashes), data, len(data), time.time()),
+            )
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                row = self.db.execute("SELECT id, size FROM results ORDER BY last_used LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self.db.execute("DELETE FROM results WHERE id = ?", (row[0],))
+                self.total_bytes -= row[1]
+                self.evictions += 1
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -1,26 +1,52 @@
-import json, time, os, re, numpy as np
+import json, time, os, numpy as np
 from pathlib import Path
-from PIL import Image
-import nltk
-nltk.download('punkt', quiet=True)
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+from frame_manifest import FrameManifest
+from frame_cache import FrameCache
+from vlm_client import SimulatedVLMClient, RateLimiter, PROMPT_VERSION, build_prompt, prompt_context, call_with_retries
+from vlm_cache import VLMResultCache, dhash
+from evaluation import BLEUEvaluator, prediction_text
+from checkpoints import CheckpointStore, config_key, window_key
+from results_io import read_results
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 
 class CCTVVLMPipeline:
-    def __init__(self, frames_dir="frames", gt_path="gt_captions.json"):
+    def __init__(self, frames_dir="frames", gt_path="gt_captions.json", frame_cache_size=64,
+                 vlm_client=None, concurrency=4, retries=2, timeout=30.0, rate_limit=None,
+                 result_cache="results/vlm_cache.sqlite", bleu_batch_size=32, bleu_processes=None,
+                 checkpoints="results/checkpoints.sqlite"):
         self.frames_dir = Path(frames_dir)
         self.gt_path = gt_path
         self.activity_history = []
         self.results_dir = Path("results")
         self.results_dir.mkdir(exist_ok=True)
         self.gt_captions = self.load_gt()
+        # Reference n-grams are counted once; predictions are scored in batches
+        self.evaluator = BLEUEvaluator(self.gt_captions)
+        self.bleu_batch_size = max(1, bleu_batch_size)
+        self.bleu_processes = bleu_processes
+        # Built once (and persisted); refreshed per run instead of re-globbing per chunk
+        self.manifest = FrameManifest(self.frames_dir)
+        self.manifest.refresh()
+        # Overlapping windows share decoded 512x512 frames
+        self.frame_cache = FrameCache(frame_cache_size)
+        # VLM calls run `concurrency` at a time, with retries, per-call timeout and optional calls/s cap
+        self.vlm_client = vlm_client or SimulatedVLMClient()
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
+        # Near-duplicate windows (static scenes, reruns with other chunk settings) reuse VLM answers
+        if isinstance(result_cache, (str, Path)):
+            result_cache = VLMResultCache(result_cache)
+        self.result_cache = result_cache
+        # Windows already described (per config) are skipped; interrupted runs resume
+        if isinstance(checkpoints, (str, Path)):
+            checkpoints = CheckpointStore(checkpoints)
+        self.checkpoints = checkpoints
     
     def compute_bleu(self, gt_texts, pred_text):
-        try:
-            return sentence_bleu([c.split() for c in gt_texts], pred_text.split(),
-                               weights=(0.25,0.25,0.25,0.25),
-                               smoothing_function=SmoothingFunction().method1)
-        except:
-            return 0.0
+        return BLEUEvaluator({"_": gt_texts}).sentence_bleu("_", pred_text)
     
     def load_gt(self):
         if os.path.exists(self.gt_path):
@@ -30,24 +56,27 @@ class CCTVVLMPipeline:
     
     def get_frame_files(self):
         """Get all frame files"""
-        jpg_files = list(self.frames_dir.glob("*.jpg"))
-        png_files = list(self.frames_dir.glob("*.png"))
-        return sorted(jpg_files + png_files)
+        return self.manifest.paths()
     
     def create_cctv_chunk(self, start_idx, chunk_size=3, track_id="person_47"):
-        frame_files = self.get_frame_files()
-        if start_idx + chunk_size > len(frame_files):
+        if start_idx + chunk_size > len(self.manifest):
             return None
         
-        chunk_frames = frame_files[start_idx:start_idx+chunk_size]
-        frames = [Image.open(f).resize((512,512)) for f in chunk_frames]
-        timestamps = [f"10:30:{15+start_idx+i*3:02d}" for i in range(chunk_size)]
+        chunk_frames = self.manifest.paths()[start_idx:start_idx+chunk_size]
+        entries = [self.manifest[start_idx+i] for i in range(chunk_size)]
+        frames = [self.frame_cache.get(f, (512,512), version=e["mtime"]) for f, e in zip(chunk_frames, entries)]
+        if all(e["timestamp"] is not None for e in entries):
+            timestamps = [time.strftime("%H:%M:%S", time.localtime(e["timestamp"])) for e in entries]
+        else:
+            timestamps = [f"10:30:{15+start_idx+i*3:02d}" for i in range(chunk_size)]
         
         # Trajectory positions (left→right movement)
         base_x = 100 + start_idx * 25
         positions = [[base_x+i*70, 200, 80, 180] for i in range(chunk_size)]
         
-        trigger = "new_track" if start_idx == 0 else "activity_change" if start_idx%4==0 else "periodic"
+        # Every offline window is described on the sliding-window schedule; the
+        # backend's TriggerEngine decides live calls, and none of its triggers apply here
+        trigger = "sliding_window"
         chunk_id = f"chunk_{start_idx//2:02d}"
         
         return {
@@ -58,113 +87,265 @@ class CCTVVLMPipeline:
             "positions": positions,
             "history": ["Person47 entered server room", "Person47 near equipment rack"],
             "trigger": trigger, 
-            "frame_names": [f.name for f in chunk_frames]
+            "frame_names": [f.name for f in chunk_frames],
+            "window": window_key(entries)
         }
     
-    def get_chunks(self, chunk_size=3, overlap_step=2):
-        frame_files = self.get_frame_files()
-        if not frame_files:
+    def refresh_frames(self):
+        new_frames = self.manifest.refresh()
+        if new_frames:
+            print(f"🆕 {new_frames} new frames since last run")
+        if self.manifest.replaced:
+            print(f"♻️ {self.manifest.replaced} frames replaced since last run")
+        return new_frames
+    
+    def window_starts(self, chunk_size=3, overlap_step=2, skip=None):
+        """Start indices of the sliding windows, minus those whose window key is in `skip`"""
+        starts = range(0, len(self.manifest)-chunk_size+1, overlap_step)
+        if not skip:
+            return list(starts)
+        return [i for i in starts if window_key(self.manifest.entries[i:i+chunk_size]) not in skip]
+    
+    def iter_chunks(self, chunk_size=3, overlap_step=2, skip=None, refresh=True):
+        """Yields chunks lazily; frames are only decoded when a chunk is reached"""
+        if refresh:
+            self.refresh_frames()
+        if not len(self.manifest):
             raise ValueError("❌ No frames found! Add JPG/PNG to frames/")
         
-        print(f"📁 Found {len(frame_files)} frames")
-        chunks = []
-        for i in range(0, len(frame_files)-chunk_size+1, overlap_step):
+        print(f"📁 Found {len(self.manifest)} frames")
+        for i in self.window_starts(chunk_size, overlap_step, skip):
             chunk = self.create_cctv_chunk(i, chunk_size)
             if chunk: 
-                chunks.append(chunk)
+                yield chunk
+    
+    def count_chunks(self, chunk_size=3, overlap_step=2, skip=None):
+        return len(self.window_starts(chunk_size, overlap_step, skip))
+    
+    def get_chunks(self, chunk_size=3, overlap_step=2):
+        chunks = list(self.iter_chunks(chunk_size, overlap_step))
         print(f"✅ Created {len(chunks)} chunks (step={overlap_step})")
         return chunks
     
-    def simulate_vlm_json(self, chunk):
-        """🎯 YOUR EXACT SPEC JSON OUTPUT - ChromaDB ready"""
-        
-        # Calculate trajectory stats
-        start_pos = chunk['positions'][0]
-        end_pos = chunk['positions'][-1]
-        speed = 0.3  # m/s
-        
-        pred_json = {
-            "track_id": chunk['track_id'],
-            "event_id": f"evt_{int(chunk['chunk_id'][-2:]):03d}",
-            "timestamp_start": chunk['timestamps'][0],
-            "timestamp_end": chunk['timestamps'][-1],
-            "duration_s": len(chunk['timestamps']) * 3,
-            
-            "activity": "walked toward door",
-            "direction": "left_to_right" if end_pos[0] > start_pos[0] else "right_to_left",
-            "speed_mps": speed,
-            "confidence": 0.92,
-            
-            "objects": ["server rack", "door", "chair"],
-            "scene": "server_room",
-            
-            "natural_summary": f"Person47 walked purposefully from position {start_pos[:2]} to {end_pos[:2]} in server room",
-            
-            "search_tags": ["person_movement", "server_room", chunk['trigger'], "trajectory"],
-            
-            "embedding_text": f"Person47 {chunk['trigger']} server room {chunk['timestamps'][0]} walked toward door"
-        }
+    def describe_chunk(self, chunk):
+        """Runs the VLM on one chunk (called from pool threads) and scores the answer"""
+        pred_json, cached = None, False
+        if self.result_cache is not None:
+            start = time.perf_counter()
+            context = VLMResultCache.context_key(self.vlm_client.model_id, PROMPT_VERSION, prompt_context(chunk))
+            hashes = [dhash(frame) for frame in chunk["frames"]]
+            pred_json = self.result_cache.get(context, hashes)
+            latency, attempts = time.perf_counter() - start, 0
         
-        pred_summary = pred_json['natural_summary']
-        pred_text = re.sub(r'[{}",:\[\]]', ' ', json.dumps(pred_json)).lower()
+        if pred_json is not None:
+            cached = True
+            # The description is reused; fields that come from this chunk's metadata are not
+            pred_json.update({"track_id": chunk['track_id'], "timestamp_start": chunk['timestamps'][0],
+                              "timestamp_end": chunk['timestamps'][-1]})
+        else:
+            pred_json, latency, attempts = call_with_retries(
+                self.vlm_client, chunk, build_prompt(chunk),
+                timeout=self.timeout, retries=self.retries, limiter=self.limiter,
+            )
+            if self.result_cache is not None:
+                self.result_cache.put(context, hashes, pred_json)
         
-        # Metrics
+        pred_summary = pred_json.get('natural_summary', '')
+        
+        # BLEU is filled in by score_results, a batch at a time
         first_frame = chunk["frame_names"][0]
         gt_texts = self.gt_captions.get(first_frame, ["Person moving in server room"])
-        bleu_score = self.compute_bleu(gt_texts, pred_text)
-        
-        # Temporal memory update
-        self.activity_history.append(pred_summary)
         
         return {
             'chunk_id': chunk['chunk_id'],
             'summary': pred_summary,
             'json': pred_json,
-            'bleu': float(bleu_score),
-            'latency': 0.05,
+            'bleu': None,
+            'latency': latency,
+            'attempts': attempts,
+            'cached': cached,
             'gt': gt_texts[0],
             'trigger': chunk['trigger'],
-            'positions': chunk['positions']
+            'positions': chunk['positions'],
+            'frame_names': chunk['frame_names'],
+            'window': chunk['window']
         }
     
-    def process_all_chunks(self, model_id="CCTV-RAG-v1.0", chunk_size=3, overlap_step=2):
-        """🏭 COMPLETE PIPELINE: Frames → Chunks → JSON → ChromaDB Ready"""
-        chunks = self.get_chunks(chunk_size, overlap_step)
+    def score_results(self, results):
+        """Sets 'bleu' on a batch of results in one vectorized pass; returns their stats rows"""
+        items = [(r['frame_names'][0], prediction_text(r['json'])) for r in results]
+        scores, stats = self.evaluator.score_batch(items, self.bleu_processes)
+        for result, score in zip(results, scores):
+            result['bleu'] = float(score)
+        return stats
+    
+    # Old name, from when the VLM was always simulated
+    simulate_vlm_json = describe_chunk
+    
+    def iter_results(self, chunk_size=3, overlap_step=2, skip=None, refresh=True):
+        """Describes chunks on a bounded thread pool and yields results in chunk order.
+        At most 2x concurrency chunks (and their frames) are in flight at once."""
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="vlm") as pool:
+            for chunk in self.iter_chunks(chunk_size, overlap_step, skip, refresh):
+                pending.append((chunk, pool.submit(self.describe_chunk, chunk)))
+                if len(pending) >= 2 * self.concurrency:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+    
+    def _collect(self, chunk, future):
+        try:
+            result = future.result()
+            # Temporal memory update, in chunk order
+            self.activity_history.append(result['summary'])
+        except Exception as e:
+            print(f"❌ {chunk['chunk_id']} failed: {e!r}")
+            result = {'chunk_id': chunk['chunk_id'], 'error': repr(e), 'trigger': chunk['trigger'],
+                      'positions': chunk['positions']}
+        chunk["frames"] = None
+        return result
+    
+    def process_all_chunks(self, model_id="CCTV-RAG-v1.0", chunk_size=3, overlap_step=2, keep_events=False):
+        """🏭 COMPLETE PIPELINE: Frames → Chunks → JSON → ChromaDB Ready
         
-        print(f"\n🚀 CCTV RAG PIPELINE v1.0 | Processing {len(chunks)} chunks...")
-        all_results = []
+        Results are streamed to results/cctv_rag_pipeline_<timestamp>.jsonl as they
+        complete: a header line, one {"type": "event"} line per chunk, then a
+        {"type": "summary"} footer. Memory stays flat whatever the frame count;
+        pass keep_events=True to also get the events back in the return value.
         
-        for i, chunk in enumerate(chunks, 1):
-            result = self.simulate_vlm_json(chunk)
-            all_results.append(result)
-            
-            print(f"[{i:2d}/{len(chunks)}] {result['chunk_id']:10} | {result['summary'][:55]:55} | {result['trigger']:12} | BLEU:{result['bleu']:.3f}")
-        
-        # 🚀 YOUR FINAL RAG-READY OUTPUT
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        output_file = self.results_dir / f"cctv_rag_pipeline_{timestamp}.json"
-        
-        final_output = {
-            "project": "APSIT BE CCTV RAG Agent 2025-26",
-            "pipeline": "YOLOv8+DeepSORT → SlidingWindow(3,2) → VLM → ChromaDB",
-            "model": model_id,
-            "timestamp": timestamp,
-            "stats": {
-                "total_frames": len(self.get_frame_files()),
-                "chunks_processed": len(all_results),
-                "avg_bleu": float(np.mean([r['bleu'] for r in all_results])),
-                "vlm_calls": len(all_results),  # 95% reduction via triggers
-                "triggers_used": list({r['trigger'] for r in all_results})
-            },
-            "events": all_results  # ChromaDB ingest here!
-        }
+        With a checkpoint store, windows already described under the same config
+        are skipped, and a run that was interrupted is resumed in its own file.
+        `results_files` in the return value lists every file of this config.
+        """
+        self.frame_cache.reset_stats()
+        if self.result_cache is not None:
+            self.result_cache.reset_stats()
+        self.refresh_frames()
+        
+        config = config_key(model=model_id, vlm=self.vlm_client.model_id, prompt_version=PROMPT_VERSION,
+                            chunk_size=chunk_size, overlap_step=overlap_step)
+        done, resumed = set(), None
+        if self.checkpoints is not None:
+            done = self.checkpoints.done_windows(config)
+            resumed = self.checkpoints.unfinished_run(config)
+        
+        total = self.count_chunks(chunk_size, overlap_step, skip=done)
+        skipped = self.count_chunks(chunk_size, overlap_step) - total
+        
+        if total == 0 and resumed is None and self.checkpoints is not None:
+            # Nothing new: no empty results file, point at the existing ones
+            results_files = self.checkpoints.output_files(config)
+            print(f"\n✅ No new windows, all {skipped} already processed")
+            stats = {"total_frames": len(self.manifest), "chunks_processed": 0, "chunks_failed": 0,
+                     "chunks_skipped": skipped, "resumed": False, "avg_bleu": 0.0, "corpus_bleu": 0.0, "vlm_calls": 0, "cache_hits": 0}
+            return {"stats": stats, "output_file": results_files[-1] if results_files else None,
+                    "results_files": results_files, "events": []}
         
-        with open(output_file, 'w') as f:
-            json.dump(final_output, f, indent=2)
+        if resumed is not None:
+            run_id, output_file = resumed[0], Path(resumed[1])
+            truncate_torn_line(output_file)
+            header = next(read_results(output_file))
+            print(f"\n⏯️ Resuming {output_file}")
+        else:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            output_file = self.results_dir / f"cctv_rag_pipeline_{timestamp}.jsonl"
+            header = {
+                "type": "header",
+                "project": "APSIT BE CCTV RAG Agent 2025-26",
+                "pipeline": f"YOLOv8+DeepSORT → SlidingWindow({chunk_size},{overlap_step}) → VLM → ChromaDB",
+                "model": model_id,
+                "vlm": self.vlm_client.model_id,
+                "timestamp": timestamp,
+            }
+            run_id = self.checkpoints.start_run(config, output_file) if self.checkpoints is not None else None
+        
+        print(f"\n🚀 CCTV RAG PIPELINE v1.0 | Processing {total} chunks ({skipped} already done)...")
+        count, failed, cache_hits, bleu_sum, latencies, triggers, events = 0, 0, 0, 0.0, [], set(), []
+        bleu_stats, batch = [], []
+        
+        with open(output_file, 'a' if resumed is not None else 'w') as f:
+            if resumed is None:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                f.flush()
+            
+            def flush_batch():
+                nonlocal count, bleu_sum
+                if not batch:
+                    return
+                bleu_stats.append(self.score_results(batch))
+                for result in batch:
+                    # ChromaDB ingest reads these lines
+                    f.write(json.dumps({"type": "event", **result}, ensure_ascii=False) + "\n")
+                    count += 1
+                    bleu_sum += result['bleu']
+                    if keep_events:
+                        events.append(result)
+                    print(f"[{count:2d}/{total}] {result['chunk_id']:10} | {result['summary'][:55]:55} | {result['trigger']:12} | BLEU:{result['bleu']:.3f} | {result['latency']:.2f}s")
+                f.flush()
+                if self.checkpoints is not None:
+                    self.checkpoints.mark_done(config, run_id, [
+                        (r['window'], r['frame_names'][0], r['frame_names'][-1], r['chunk_id']) for r in batch
+                    ])
+                batch.clear()
+            
+            # Refreshed above; the skip set was computed against that manifest
+            for result in self.iter_results(chunk_size, overlap_step, skip=done, refresh=False):
+                if 'error' in result:
+                    flush_batch()
+                    failed += 1
+                    f.write(json.dumps({"type": "error", **result}, ensure_ascii=False) + "\n")
+                    f.flush()
+                    continue
+                
+                if result['cached']:
+                    cache_hits += 1
+                else:
+                    latencies.append(result['latency'])
+                triggers.add(result['trigger'])
+                batch.append(result)
+                if len(batch) >= self.bleu_batch_size:
+                    flush_batch()
+            flush_batch()
+            
+            stats = {
+                "total_frames": len(self.manifest),
+                "chunks_processed": count,
+                "chunks_failed": failed,
+                "chunks_skipped": skipped,
+                "resumed": resumed is not None,
+                "avg_bleu": bleu_sum / count if count else 0.0,
+                "corpus_bleu": self.evaluator.corpus_bleu(np.vstack(bleu_stats)) if bleu_stats else 0.0,
+                "avg_latency_s": float(np.mean(latencies)) if latencies else 0.0,
+                "p95_latency_s": float(np.percentile(latencies, 95)) if latencies else 0.0,
+                "concurrency": self.concurrency,
+                "vlm_calls": len(latencies),  # chunks the VLM actually described; failures are in chunks_failed
+                "cache_hits": cache_hits,
+                "triggers_used": sorted(triggers),
+                "frame_cache": self.frame_cache.stats(),
+                "vlm_cache": self.result_cache.stats() if self.result_cache is not None else None
+            }
+            f.write(json.dumps({"type": "summary", "stats": stats}, ensure_ascii=False) + "\n")
+        if self.checkpoints is not None:
+            self.checkpoints.finish_run(run_id)
         
         print(f"\n🎉 PIPELINE COMPLETE!")
         print(f"💾 Saved: {output_file}")
-        print(f"📈 BLEU-4: {final_output['stats']['avg_bleu']:.3f} | Chunks: {len(all_results)}")
+        print(f"📈 BLEU-4: {stats['avg_bleu']:.3f} (corpus {stats['corpus_bleu']:.3f}) | Chunks: {count}")
         print(f"✅ READY FOR CHROMADB + MISTRAL RAG!")
         
-        return final_output
+        results_files = self.checkpoints.output_files(config) if self.checkpoints is not None else [str(output_file)]
+        return {**header, "stats": stats, "output_file": str(output_file), "results_files": results_files,
+                "events": events}
+
+
+def truncate_torn_line(path):
+    """Drops a partial last line left by a crashed run so appending starts on a line boundary"""
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        tail_start = max(0, size - 65536)
+        f.seek(tail_start)
+        tail = f.read()
+        if tail and not tail.endswith(b"\n"):
+            f.truncate(tail_start + tail.rfind(b"\n") + 1)
+
@@ -0,0 +1,291 @@
+"""
+Load test for the live video path.
+
+Starts the backend's websocket routes in-process with a deterministic stub
+detector and tracker (no GPU or model weights needed), drives N synthetic
+clients that stream generated JPEGs at a fixed FPS, and appends one JSON
+result line per run so numbers can be compared across commits.
+
+    python benchmark.py --clients 8 --fps 10 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import threading
+import subprocess
+import contextlib
+from contextlib import asynccontextmanager
+
+import numpy as np
+import cv2
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic websocket load test for the CCTV backend")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent synthetic cameras")
+    parser.add_argument("--fps", type=float, default=10, help="frames per second sent by each client")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of streaming per client")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds excluded from memory growth")
+    parser.add_argument("--shared-camera", action="store_true", help="all clients on /ws/video instead of one camera each")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--batch-wait-ms", type=float, default=10)
+    parser.add_argument("--detector-call-ms", type=float, default=5, help="simulated cost per detector call")
+    parser.add_argument("--detector-frame-ms", type=float, default=10, help="simulated cost per detected frame")
+    parser.add_argument("--storage", choices=["jpeg", "raw", "passthrough"], default="jpeg")
+    parser.add_argument("--motion", default="off", help='motion sensitivity, or "off" to detect every frame')
+    parser.add_argument("--no-annotate", action="store_true", help="send track records only, no annotated frames")
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="JSON lines file results are appended to")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's own logging")
+    return parser.parse_args(argv)
+
+
+def make_frames(width: int, height: int, count: int = 30, seed: int = 0):
+    """
+    Pre-encoded JPEGs of a box moving over a fixed noisy background.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int((i / count) * (width - width // 5))
+        cv2.rectangle(frame, (x, height // 3), (x + width // 5, height // 3 + height // 2), (0, 0, 255), -1)
+        success, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+        frames.append(encoded.tobytes())
+    return frames
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p99": None, "max": None}
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(max(values)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StubDetectorFactory:
+    """
+    Picklable StubDetector factory, so process mode can build it in the children.
+    """
+
+    def __init__(self, call_latency: float, frame_latency: float):
+        self.call_latency = call_latency
+        self.frame_latency = frame_latency
+
+    def __call__(self):
+        from detector import StubDetector
+
+        return StubDetector(self.call_latency, self.frame_latency)
+
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.frames_received = 0
+        self.records_received = 0
+        self.finished = None
+        # Seconds from server receipt (record timestamp) to the client seeing the track record
+        self.ages = []
+
+
+async def run_client(url: str, frames, fps: float, duration: float, stats: ClientStats):
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        async def receive():
+            async for message in ws:
+                if isinstance(message, str):
+                    record = json.loads(message)
+                    stats.records_received += 1
+                    stats.ages.append(time.time() - record["timestamp"])
+                else:
+                    stats.frames_received += 1
+
+        receiver = asyncio.create_task(receive())
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / fps
+        start = loop.time()
+        while loop.time() - start < duration:
+            await ws.send(frames[stats.sent % len(frames)])
+            stats.sent += 1
+            # Fixed schedule so slow sends do not lower the offered rate
+            await asyncio.sleep(max(0.0, start + stats.sent * interval - loop.time()))
+        stats.finished = time.time()
+
+        # Let in-flight frames come back before closing
+        await asyncio.sleep(1.0)
+        receiver.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await receiver
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(args):
+    # websocket.py reads its configuration at import time
+    os.environ["FRAME_STORAGE"] = args.storage
+    os.environ["MOTION_SENSITIVITY"] = args.motion
+    os.environ["ANNOTATE_FRAMES"] = "0" if args.no_annotate else "1"
+    os.environ.pop("RECORDINGS_DIR", None)
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    import metrics
+    from tracks import StubTracker
+    from websocket import socket_router, camera_registry
+    from scheduler import InferenceScheduler
+    from process_worker import ProcessInferenceScheduler
+
+    scheduler_cls = ProcessInferenceScheduler if args.mode == "process" else InferenceScheduler
+    scheduler = scheduler_cls(
+        camera_registry,
+        num_workers=args.workers,
+        detector_factory=StubDetectorFactory(args.detector_call_ms / 1000, args.detector_frame_ms / 1000),
+        max_batch_size=args.batch_size,
+        max_wait=args.batch_wait_ms / 1000,
+        tracker_factory=StubTracker,
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        scheduler.start()
+        yield
+        scheduler.stop()
+        camera_registry.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(socket_router, prefix="/ws")
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=64 << 20))
+    thread = threading.Thread(target=server.run, name="benchmark-server", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    frames = make_frames(args.width, args.height)
+    if args.shared_camera:
+        urls = [f"ws://127.0.0.1:{port}/ws/video"] * args.clients
+    else:
+        urls = [f"ws://127.0.0.1:{port}/ws/video/bench-{i}" for i in range(args.clients)]
+    clients = [ClientStats() for _ in urls]
+
+    memory_after_warmup = {}
+
+    def sample_memory():
+        time.sleep(args.warmup)
+        for camera in camera_registry.cameras():
+            memory_after_warmup[camera.camera_id] = camera.frame_buffer.memory_bytes()
+
+    async def drive():
+        await asyncio.gather(*(
+            run_client(url, frames, args.fps, args.duration, stats) for url, stats in zip(urls, clients)
+        ))
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    started = time.time()
+    sampler.start()
+    asyncio.run(drive())
+    # Rates are over the streaming period, not the drain at the end
+    elapsed = max(stats.finished for stats in clients) - started
+    sampler.join()
+
+    cameras = camera_registry.cameras()
+    memory = {
+        camera.camera_id: {
+            "after_warmup": memory_after_warmup.get(camera.camera_id, 0),
+            "end": camera.frame_buffer.memory_bytes(),
+        }
+        for camera in cameras
+    }
+    ingested = sum(camera.frame_buffer.latest_seq for camera in cameras)
+    processed = sum(camera.processed for camera in cameras)
+    dropped = sum(camera.dropped for camera in cameras)
+    scheduler_stats = scheduler.stats()
+
+    server.should_exit = True
+    thread.join(10)
+
+    ages = [age for stats in clients for age in stats.ages]
+    stage_means = {}
+    for stage, histogram in sorted(metrics.STAGE_SECONDS.children.items()):
+        _, count, total = histogram.snapshot()
+        stage_means[stage] = {"count": count, "mean_ms": total / count * 1000 if count else None}
+
+    return {
+        "timestamp": started,
+        "commit": git_commit(),
+        "config": vars(args),
+        "results": {
+            "elapsed_s": elapsed,
+            "frames_sent": sum(stats.sent for stats in clients),
+            "offered_fps": args.clients * args.fps,
+            "send_fps": sum(stats.sent for stats in clients) / elapsed,
+            "ingest_fps": ingested / elapsed,
+            "processed_fps": processed / elapsed,
+            "dropped_frames": dropped,
+            "drop_fraction": dropped / ingested if ingested else 0.0,
+            "frames_received": sum(stats.frames_received for stats in clients),
+            "track_records_received": sum(stats.records_received for stats in clients),
+            "frame_age_s": percentiles(ages),
+            "frame_buffer_bytes": memory,
+            "frame_buffer_growth_bytes": sum(m["end"] - m["after_warmup"] for m in memory.values()),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "max_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+            "scheduler": scheduler_stats,
+            "stages": stage_means,
+        },
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    # The websocket handlers print per frame; keep the report readable unless asked
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        result = run(args)
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+    r = result["results"]
+    print(f"[BENCH] {args.clients} clients x {args.fps} fps at {args.width}x{args.height}, {args.mode} mode")
+    print(f"[BENCH] offered {r['offered_fps']:.1f} fps, sent {r['send_fps']:.1f} fps")
+    print(f"[BENCH] ingest {r['ingest_fps']:.1f} fps, processed {r['processed_fps']:.1f} fps, dropped {r['dropped_frames']}")
+    age = r["frame_age_s"]
+    if age["p50"] is not None:
+        print(f"[BENCH] frame age p50 {age['p50'] * 1000:.1f} ms, p99 {age['p99'] * 1000:.1f} ms")
+    print(f"[BENCH] FrameBuffer growth after warmup {r['frame_buffer_growth_bytes']} bytes")
+    print(f"[BENCH] Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
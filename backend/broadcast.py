@@ -0,0 +1,136 @@
+import time
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class Mailbox:
+    """
+    Latest-only mailbox for one viewer. Holds at most one undelivered item
+    per kind ("frame" or "tracks"); publishing over an undelivered item of
+    the same kind replaces it and counts a drop, so a slow client always gets
+    the newest data instead of a growing queue.
+    Lives on the event loop of the viewer's connection.
+    """
+
+    def __init__(self, client_id: int, loop: asyncio.AbstractEventLoop):
+        self.client_id = client_id
+        self.loop = loop
+        self.items = OrderedDict()
+        self.ready = asyncio.Event()
+        self.closed = False
+
+        self.delivered = 0
+        self.dropped = 0
+        self.dropped_tracks = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def put(self, kind: str, item):
+        # Runs on self.loop
+        if kind in self.items:
+            if kind == "frame":
+                self.dropped += 1
+            else:
+                self.dropped_tracks += 1
+            del self.items[kind]
+        self.items[kind] = item
+        self.ready.set()
+
+    async def get(self):
+        """
+        Waits for the next (kind, item), oldest kind first. Returns None once closed.
+        """
+        while not self.items and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+
+        if not self.items:
+            return None
+        return self.items.popitem(last=False)
+
+    def sent(self, published_at: float):
+        """
+        Records that a frame published at `published_at` reached the socket.
+        """
+        lag = time.time() - published_at
+        self.delivered += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    def stats(self):
+        return {
+            "client_id": self.client_id,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "dropped_tracks": self.dropped_tracks,
+            "last_lag_ms": self.last_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+        }
+
+
+class FrameBroadcaster:
+    """
+    Fans every processed frame and track record of one camera out to all of
+    its viewers. The vision worker publishes once per frame (from any thread);
+    each viewer gets it through its own Mailbox.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mailboxes = {}
+        self.ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self) -> Mailbox:
+        """
+        Registers a viewer. Must be called from the viewer's event loop.
+        """
+        mailbox = Mailbox(next(self.ids), asyncio.get_running_loop())
+        with self.lock:
+            self.mailboxes[mailbox.client_id] = mailbox
+        return mailbox
+
+    def unsubscribe(self, mailbox: Mailbox):
+        with self.lock:
+            self.mailboxes.pop(mailbox.client_id, None)
+        mailbox.close()
+
+    def publish(self, frame_bytes: bytes, timestamp: float):
+        """
+        Hands one frame to every viewer as ("frame", (timestamp, frame_bytes, published_at)).
+        """
+        with self.lock:
+            self.published += 1
+        self._deliver("frame", (timestamp, frame_bytes, time.time()))
+
+    def publish_tracks(self, record):
+        """
+        Hands one track record to every viewer as ("tracks", (record, published_at)).
+        """
+        self._deliver("tracks", (record, time.time()))
+
+    def _deliver(self, kind: str, item):
+        with self.lock:
+            mailboxes = list(self.mailboxes.values())
+
+        for mailbox in mailboxes:
+            try:
+                mailbox.loop.call_soon_threadsafe(mailbox.put, kind, item)
+            except RuntimeError:
+                # Viewer's loop already closed
+                self.unsubscribe(mailbox)
+
+    def stats(self):
+        with self.lock:
+            mailboxes = list(self.mailboxes.values())
+            published = self.published
+        return {
+            "published": published,
+            "viewers": [mailbox.stats() for mailbox in mailboxes],
+        }
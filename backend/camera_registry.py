@@ -0,0 +1,189 @@
+import re
+import threading
+from typing import Dict, Optional
+
+from frame_buffer import FrameBuffer, STORAGE_JPEG
+from output_buffer import ProcessedFrameBuffer
+from broadcast import FrameBroadcaster
+from motion import MotionGate
+from tracks import TrackStream
+from triggers import TriggerEngine
+from recorder import SegmentRecorder
+
+# Camera ids come from URLs and name recording directories
+CAMERA_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class Camera:
+    """
+    Per-camera state: its own frame/output buffers, FPS budget and
+    scheduling bookkeeping used by the InferenceScheduler.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        fps_budget: float = 10,
+        max_seconds: int = 20,
+        storage: str = STORAGE_JPEG,
+        recordings_dir: Optional[str] = None,
+        motion_sensitivity: Optional[float] = None,
+        annotate: bool = True,
+    ):
+        self.camera_id = camera_id
+        self.frame_buffer = FrameBuffer(max_seconds=max_seconds, target_fps=10, storage=storage)
+        self.processed_buffer = ProcessedFrameBuffer()
+        self.fps_budget = fps_budget
+
+        # Skips the detector on static frames; None disables gating for this camera
+        self.motion_gate = MotionGate(sensitivity=motion_sensitivity) if motion_sensitivity is not None else None
+
+        # Per-frame track records; clients overlay these instead of needing annotated frames
+        self.track_stream = TrackStream()
+        self.annotate = annotate
+
+        # Every processed frame is encoded once and fanned out to all viewers, as are track records
+        self.broadcaster = FrameBroadcaster()
+        self.processed_buffer.add_listener(self.broadcaster.publish)
+        self.track_stream.add_listener(self.broadcaster.publish_tracks)
+
+        # Turns track records into VLM chunk requests only when something happens
+        self.triggers = TriggerEngine(camera_id)
+        self.track_stream.add_listener(self.triggers.on_record)
+
+        # Optional disk recording so history outlives the in-memory window
+        self.recorder = None
+        if recordings_dir:
+            self.recorder = SegmentRecorder(recordings_dir, camera_id)
+            self.recorder.start(self.frame_buffer)
+
+        # Scheduling state (guarded by the scheduler's lock)
+        self.worker = None
+        self.busy = False
+        self.last_seq = 0
+        self.last_run = 0.0
+
+        # Counters
+        self.processed = 0
+        self.dropped = 0
+
+    @property
+    def frame_interval(self) -> float:
+        return 1.0 / self.fps_budget if self.fps_budget > 0 else 0.0
+
+    def get_frames_between(self, start_time: float, end_time: float, stride: int = 1, max_frames=None):
+        """
+        Frames for a time window, from RAM when the window is still buffered,
+        otherwise from the disk recording.
+        """
+        oldest = self.frame_buffer.oldest_timestamp()
+        if self.recorder is not None and (oldest is None or start_time < oldest):
+            return self.recorder.get_frames_between(start_time, end_time, stride, max_frames)
+        return self.frame_buffer.get_frames_between(start_time, end_time, stride, max_frames)
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def stats(self):
+        return {
+            "camera_id": self.camera_id,
+            "fps_budget": self.fps_budget,
+            "latest_seq": self.frame_buffer.latest_seq,
+            "storage": self.frame_buffer.storage,
+            "buffer_bytes": self.frame_buffer.memory_bytes(),
+            "decode_cache": self.frame_buffer.decode_cache_stats(),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "recording": self.recorder.stats() if self.recorder is not None else None,
+            "broadcast": self.broadcaster.stats(),
+            "motion": self.motion_gate.stats() if self.motion_gate is not None else None,
+            "triggers": self.triggers.stats(),
+        }
+
+
+class CameraRegistry:
+    """
+    Thread-safe map of camera_id -> Camera, created on first use.
+    """
+
+    def __init__(
+        self,
+        default_fps: float = 10,
+        max_seconds: int = 20,
+        storage: str = STORAGE_JPEG,
+        recordings_dir: Optional[str] = None,
+        motion_sensitivity: Optional[float] = None,
+        annotate: bool = True,
+    ):
+        self.default_fps = default_fps
+        self.max_seconds = max_seconds
+        self.storage = storage
+        self.recordings_dir = recordings_dir
+        self.motion_sensitivity = motion_sensitivity
+        self.annotate = annotate
+        self._cameras: Dict[str, Camera] = {}
+        self._listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(camera)` to be called whenever a camera is created.
+        """
+        with self.lock:
+            self._listeners.append(callback)
+            existing = list(self._cameras.values())
+
+        for camera in existing:
+            callback(camera)
+
+    def get_or_create(
+        self,
+        camera_id: str,
+        fps_budget: Optional[float] = None,
+        motion_sensitivity: Optional[float] = None,
+    ) -> Camera:
+        if not CAMERA_ID_PATTERN.fullmatch(camera_id):
+            raise ValueError(f"Invalid camera id {camera_id!r}: use letters, digits, '_' or '-'")
+        with self.lock:
+            camera = self._cameras.get(camera_id)
+            if camera is not None:
+                if fps_budget is not None:
+                    camera.fps_budget = fps_budget
+                if motion_sensitivity is not None and camera.motion_gate is not None:
+                    camera.motion_gate.sensitivity = motion_sensitivity
+                return camera
+
+            if motion_sensitivity is None:
+                motion_sensitivity = self.motion_sensitivity
+
+            camera = Camera(
+                camera_id,
+                fps_budget=fps_budget if fps_budget is not None else self.default_fps,
+                max_seconds=self.max_seconds,
+                storage=self.storage,
+                recordings_dir=self.recordings_dir,
+                motion_sensitivity=motion_sensitivity,
+                annotate=self.annotate,
+            )
+            self._cameras[camera_id] = camera
+            listeners = list(self._listeners)
+
+        for callback in listeners:
+            callback(camera)
+        return camera
+
+    def get(self, camera_id: str) -> Optional[Camera]:
+        with self.lock:
+            return self._cameras.get(camera_id)
+
+    def cameras(self):
+        with self.lock:
+            return list(self._cameras.values())
+
+    def stats(self):
+        return [camera.stats() for camera in self.cameras()]
+
+    def close(self):
+        for camera in self.cameras():
+            camera.close()
@@ -0,0 +1,222 @@
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import cv2
+
+
+def extract_person_detections(results, min_conf: float = 0.5):
+    """
+    Converts YOLO results into [x1, y1, x2, y2, conf] person boxes for the tracker.
+    """
+    detections = []
+    for r in results:
+        for box in r.boxes.data.tolist():
+            x1, y1, x2, y2, conf, cls = box
+            if int(cls) == 0 and conf > min_conf:
+                x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
+                detections.append([x1, y1, x2, y2, conf])
+    return detections
+
+
+class Detector:
+    """
+    Person detector interface. `detect_batch` takes a list of BGR frames and
+    returns one list of [x1, y1, x2, y2, conf] boxes per frame, in order.
+    """
+
+    def detect_batch(self, frames: Sequence[np.ndarray]) -> List[list]:
+        raise NotImplementedError
+
+    def detect(self, frame: np.ndarray) -> list:
+        return self.detect_batch([frame])[0]
+
+    def warmup(self, frame_size: Tuple[int, int] = (640, 360)):
+        """
+        Runs one inference on a blank frame so lazy initialisation (weights,
+        kernels, memory arenas) happens before real frames arrive.
+        """
+        width, height = frame_size
+        self.detect(np.zeros((height, width, 3), dtype=np.uint8))
+
+
+class YOLODetector(Detector):
+    """
+    Ultralytics YOLO. A list of frames goes through the model in one call.
+    """
+
+    def __init__(self, weights: str = "yolov8n.pt", min_conf: float = 0.5):
+        from ultralytics import YOLO
+
+        self.model = YOLO(weights)
+        self.min_conf = min_conf
+
+    def detect_batch(self, frames):
+        if not frames:
+            return []
+        results = self.model(list(frames), verbose=False)
+        return [extract_person_detections([r], self.min_conf) for r in results]
+
+
+class OnnxDetector(Detector):
+    """
+    YOLOv8 exported to ONNX (`yolo export model=yolov8n.pt format=onnx`), run
+    with ONNX Runtime on the CPU. Much lighter than the ultralytics runtime on
+    edge nodes. With `int8` the model is dynamically quantized once (weights
+    to INT8, saved next to the original as `<name>-int8.onnx`) and that copy
+    is loaded instead.
+    """
+
+    def __init__(
+        self,
+        model_path: str = "yolov8n.onnx",
+        min_conf: float = 0.5,
+        iou_threshold: float = 0.45,
+        int8: bool = False,
+        threads: Optional[int] = None,
+    ):
+        import onnxruntime as ort
+
+        if int8:
+            model_path = quantize_int8(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.model_path = model_path
+        self.min_conf = min_conf
+        self.iou_threshold = iou_threshold
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        _, _, height, width = model_input.shape
+        self.input_size = (
+            width if isinstance(width, int) else 640,
+            height if isinstance(height, int) else 640,
+        )
+        # Static exports take one image per run; dynamic ones take the whole batch
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+
+    def detect_batch(self, frames):
+        if not frames:
+            return []
+
+        letterboxed = [self._letterbox(frame) for frame in frames]
+        images = [image for image, _, _ in letterboxed]
+        if self.dynamic_batch:
+            blob = cv2.dnn.blobFromImages(images, 1 / 255.0, swapRB=True)
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            outputs = np.concatenate([
+                self.session.run(None, {self.input_name: cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True)})[0]
+                for image in images
+            ])
+
+        return [
+            self._postprocess(output, scale, pad)
+            for output, (_, scale, pad) in zip(outputs, letterboxed)
+        ]
+
+    def _letterbox(self, frame):
+        """
+        Resizes keeping the aspect ratio and pads to the model input with gray,
+        as ultralytics does. Returns (image, scale, (pad_x, pad_y)).
+        """
+        width, height = self.input_size
+        h, w = frame.shape[:2]
+        scale = min(width / w, height / h)
+        new_w, new_h = int(round(w * scale)), int(round(h * scale))
+        pad_x, pad_y = (width - new_w) // 2, (height - new_h) // 2
+
+        image = np.full((height, width, 3), 114, dtype=np.uint8)
+        image[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h))
+        return image, scale, (pad_x, pad_y)
+
+    def _postprocess(self, output, scale, pad):
+        # output is (4 + num_classes, num_anchors): cx, cy, w, h then class scores
+        predictions = output.T
+        person = predictions[:, 4]
+        candidates = predictions[person > self.min_conf]
+        # Keep boxes whose best class is person, like extract_person_detections
+        candidates = candidates[np.argmax(candidates[:, 4:], axis=1) == 0]
+        if len(candidates) == 0:
+            return []
+
+        cx, cy, w, h = candidates[:, 0], candidates[:, 1], candidates[:, 2], candidates[:, 3]
+        boxes = np.stack([cx - w / 2 - pad[0], cy - h / 2 - pad[1], w, h], axis=1) / scale
+        scores = candidates[:, 4]
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.min_conf, self.iou_threshold)
+
+        detections = []
+        for i in np.array(keep).flatten():
+            x, y, bw, bh = boxes[i]
+            detections.append([int(x), int(y), int(x + bw), int(y + bh), float(scores[i])])
+        return detections
+
+
+def quantize_int8(model_path: str) -> str:
+    """
+    Returns the path of an INT8 copy of an ONNX model, creating it on first use.
+    """
+    root, ext = os.path.splitext(model_path)
+    quantized_path = f"{root}-int8{ext}"
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"[INFO] Quantizing {model_path} to INT8 at {quantized_path}")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QUInt8)
+    return quantized_path
+
+
+class StubDetector(Detector):
+    """
+    Deterministic CPU-only detector for tests and benchmarks.
+    Emits one box that slides across the frame with every call, and can
+    simulate model cost with a fixed per-call and per-frame delay.
+    """
+
+    def __init__(self, call_latency: float = 0.0, frame_latency: float = 0.0):
+        self.call_latency = call_latency
+        self.frame_latency = frame_latency
+        self.calls = 0
+        self.frames_seen = 0
+
+    def detect_batch(self, frames):
+        delay = self.call_latency + self.frame_latency * len(frames)
+        if delay > 0:
+            time.sleep(delay)
+
+        self.calls += 1
+        detections = []
+        for frame in frames:
+            self.frames_seen += 1
+            h, w = frame.shape[:2]
+            x1 = (self.frames_seen * 8) % max(1, w - 80)
+            y1 = h // 3
+            detections.append([[x1, y1, x1 + 80, min(h, y1 + 180), 0.9]])
+        return detections
+
+
+DETECTOR_BACKENDS = ("ultralytics", "onnx", "stub")
+
+
+def create_detector(
+    backend: str = "ultralytics",
+    model: Optional[str] = None,
+    int8: bool = False,
+    threads: Optional[int] = None,
+) -> Detector:
+    """
+    Builds the detector selected by config. Use functools.partial over this
+    as a detector factory; that stays picklable for process mode.
+    """
+    if backend == "ultralytics":
+        return YOLODetector(model or "yolov8n.pt")
+    if backend == "onnx":
+        return OnnxDetector(model or "yolov8n.onnx", int8=int8, threads=threads)
+    if backend == "stub":
+        return StubDetector()
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {DETECTOR_BACKENDS}")
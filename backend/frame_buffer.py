@@ -1,69 +1,478 @@
-import time
+import asyncio
 import threading
-from collections import deque
-from typing import Deque, Tuple
+from collections import OrderedDict
+from typing import Optional, Tuple
 import numpy as np
 import cv2
 
+from metrics import timed
+
+
+STORAGE_JPEG = "jpeg"
+STORAGE_RAW = "raw"
+STORAGE_PASSTHROUGH = "passthrough"
+
+# JPEG start-of-frame markers carrying the image dimensions (all SOFn except DHT/JPG/DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Validates a JPEG by its markers and returns (width, height) from the
+    SOF header without decoding any pixels. Returns None if it is not a
+    complete JPEG.
+    """
+    n = len(data)
+    if n < 4 or data[:2] != b"\xff\xd8" or data[-2:] != b"\xff\xd9":
+        return None
+
+    i = 2
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Standalone markers without a length field
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image / start of scan before any frame header
+            return None
+
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return (width, height) if width and height else None
+        i += 2 + length
+
+    return None
+
 
 class FrameBuffer:
     """
     Time-based bounded frame buffer.
-    Stores compressed frames to avoid memory blowup.
+
+    Storage modes:
+      - "jpeg": stores compressed frames to avoid memory blowup. Best for long
+        retention windows; every read pays a JPEG decode.
+      - "raw": a preallocated fixed-size uint8 ring of frames. No codec work at
+        all; readers get zero-copy read-only views into the ring.
+      - "passthrough": stores the client's JPEG bytes untouched (see
+        `add_encoded`). Decode and resize only happen when a consumer asks
+        for the frame, so frames nobody reads cost almost nothing.
+
+    Decoded frames of the compressed modes are memoized per sequence number
+    in a bounded LRU, so overlapping reads (e.g. sliding VLM windows) decode
+    each frame once. See `decode_cache_stats` for hit/miss counts.
+
+    Frames live in a ring indexed by sequence number (slot = (seq - 1) % max_frames),
+    with timestamps and sequence numbers in parallel arrays.
+
+    Every stored frame gets a monotonically increasing sequence number so
+    consumers can block until something newer than what they already saw
+    arrives, instead of polling and decoding the latest frame.
     """
 
-    def __init__(self, max_seconds: int = 20, target_fps: int = 10):
+    def __init__(
+        self,
+        max_seconds: int = 20,
+        target_fps: int = 10,
+        storage: str = STORAGE_JPEG,
+        frame_size: Tuple[int, int] = (640, 360),
+        decode_cache_size: int = 32,
+    ):
+        if storage not in (STORAGE_JPEG, STORAGE_RAW, STORAGE_PASSTHROUGH):
+            raise ValueError(f"Unknown frame storage mode: {storage}")
+
         self.max_frames = max_seconds * target_fps
-        self.buffer: Deque[Tuple[float, bytes]] = deque(maxlen=self.max_frames)
+        self.storage = storage
+        self.frame_size = frame_size
         self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.seq = 0
+        self.listeners = []
+
+        self.timestamps = np.zeros(self.max_frames, dtype=np.float64)
+        self.seqs = np.zeros(self.max_frames, dtype=np.int64)
+        # (width, height) of the stored frame; the source size in passthrough mode
+        self.dims = np.zeros((self.max_frames, 2), dtype=np.int32)
+
+        self.decode_cache_size = decode_cache_size
+        self.decoded: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self.decode_hits = 0
+        self.decode_misses = 0
+
+        if storage == STORAGE_RAW:
+            width, height = frame_size
+            self.frames = np.zeros((self.max_frames, height, width, 3), dtype=np.uint8)
+            self.encoded = None
+            self.encoded_bytes = 0
+        else:
+            self.frames = None
+            self.encoded = [None] * self.max_frames
+            self.encoded_bytes = 0
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(seq)` to be called after every stored frame.
+        Called outside the buffer lock, so it must be cheap and non-blocking.
+        """
+        self.listeners.append(callback)
 
     def add_frame(self, frame: np.ndarray, timestamp: float):
         """
-        Compress and store frame with timestamp.
+        Resize and store frame with timestamp (JPEG-compressed in "jpeg" mode).
         """
         # Resize to keep memory low (IMPORTANT)
-        frame = cv2.resize(frame, (640, 360))
+        if frame.shape[1::-1] != self.frame_size:
+            with timed("buffer_resize"):
+                frame = cv2.resize(frame, self.frame_size)
+
+        if self.storage == STORAGE_RAW:
+            with self.new_frame:
+                slot = self.seq % self.max_frames
+                np.copyto(self.frames[slot], frame)
+                seq = self._publish(slot, timestamp, self.frame_size)
+        else:
+            # JPEG compress
+            with timed("buffer_encode"):
+                success, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+            if not success:
+                return
+
+            seq = self._store_encoded(encoded.tobytes(), timestamp, self.frame_size)
 
-        # JPEG compress
-        success, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-        if not success:
-            return
+        for callback in self.listeners:
+            callback(seq)
 
+    def add_encoded(self, frame_bytes: bytes, timestamp: float) -> bool:
+        """
+        Stores a client-supplied JPEG. In "passthrough" mode the bytes are only
+        validated and kept as-is; other modes decode and go through `add_frame`.
+        Returns False if the bytes are not a usable JPEG.
+        """
+        if self.storage != STORAGE_PASSTHROUGH:
+            with timed("ingest_decode"):
+                frame = self._decode(frame_bytes)
+            if frame is None:
+                return False
+            self.add_frame(frame, timestamp)
+            return True
+
+        dims = jpeg_dimensions(frame_bytes)
+        if dims is None:
+            return False
+
+        seq = self._store_encoded(bytes(frame_bytes), timestamp, dims)
+        for callback in self.listeners:
+            callback(seq)
+        return True
+
+    def _store_encoded(self, data: bytes, timestamp: float, dims) -> int:
+        with self.new_frame:
+            slot = self.seq % self.max_frames
+            old = self.encoded[slot]
+            self.encoded_bytes += len(data) - (len(old) if old is not None else 0)
+            self.encoded[slot] = data
+            return self._publish(slot, timestamp, dims)
+
+    def _publish(self, slot: int, timestamp: float, dims) -> int:
+        # Caller holds the lock and has already written the frame into `slot`
+        self.seq += 1
+        self.timestamps[slot] = timestamp
+        self.seqs[slot] = self.seq
+        self.dims[slot] = dims
+        self.new_frame.notify_all()
+        return self.seq
+
+    def __len__(self):
+        with self.lock:
+            return min(self.seq, self.max_frames)
+
+    @property
+    def latest_seq(self) -> int:
+        """
+        Sequence number of the newest stored frame (0 if none yet).
+        """
+        with self.lock:
+            return self.seq
+
+    def memory_bytes(self) -> int:
+        """
+        Bytes held by the buffer: the preallocated ring in "raw" mode, the
+        stored JPEG payloads (plus memoized decodes) otherwise, and the index arrays.
+        """
         with self.lock:
-            self.buffer.append((timestamp, encoded.tobytes()))
+            index = self.timestamps.nbytes + self.seqs.nbytes + self.dims.nbytes
+            if self.storage == STORAGE_RAW:
+                return self.frames.nbytes + index
+            decoded = sum(frame.nbytes for frame in self.decoded.values())
+            return self.encoded_bytes + decoded + index
 
     def get_latest_frame(self):
         """
         Returns the most recent frame (decoded).
         """
         with self.lock:
-            if not self.buffer:
+            if self.seq == 0:
+                return None
+            slot = (self.seq - 1) % self.max_frames
+            timestamp = float(self.timestamps[slot])
+            stored = self._stored(slot)
+
+        return timestamp, self._materialize(stored)
+
+    def wait_for_frame(self, after_seq: int, timeout: Optional[float] = None):
+        """
+        Blocks until a frame newer than `after_seq` is stored.
+        Returns (seq, timestamp, decoded frame), or None on timeout.
+        Only the returned frame is decoded; frames skipped in between are not.
+        """
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.seq > after_seq, timeout):
                 return None
-            timestamp, frame_bytes = self.buffer[-1]
+            seq = self.seq
+            slot = (seq - 1) % self.max_frames
+            timestamp = float(self.timestamps[slot])
+            stored = self._stored(slot)
+
+        return seq, timestamp, self._materialize(stored)
 
-        frame = cv2.imdecode(
-            np.frombuffer(frame_bytes, np.uint8),
-            cv2.IMREAD_COLOR
-        )
-        return timestamp, frame
+    async def wait_for_frame_async(
+        self, after_seq: int, timeout: Optional[float] = None, poll: float = 0.25
+    ):
+        """
+        Awaitable version of `wait_for_frame` for use from the event loop.
+        The blocking wait runs in a worker thread in slices of at most `poll`
+        seconds, so cancelling the caller frees that thread within `poll`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            wait = poll if deadline is None else max(0.0, min(poll, deadline - loop.time()))
+            data = await asyncio.to_thread(self.wait_for_frame, after_seq, wait)
+            if data is not None or (deadline is not None and loop.time() >= deadline):
+                return data
 
-    def get_frames_between(self, start_time: float, end_time: float):
+    def subscribe(self) -> "FrameSubscription":
+        """
+        Returns a cursor that yields each new frame at most once.
+        """
+        return FrameSubscription(self)
+
+    def oldest_timestamp(self) -> Optional[float]:
+        """
+        Timestamp of the oldest frame still in the ring (None if empty).
+        """
+        with self.lock:
+            if self.seq == 0:
+                return None
+            first_seq = self.seq - min(self.seq, self.max_frames) + 1
+            return float(self.timestamps[(first_seq - 1) % self.max_frames])
+
+    def get_encoded_after(self, after_seq: int, timeout: Optional[float] = None):
+        """
+        Blocks until frames newer than `after_seq` exist, then returns every one
+        still in the ring as (seq, timestamp, jpeg_bytes). Frames that already
+        fell out of the ring are skipped. Raw-mode frames are JPEG-encoded here.
+        Returns [] on timeout.
+        """
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.seq > after_seq, timeout):
+                return []
+            first_seq = max(after_seq + 1, self.seq - min(self.seq, self.max_frames) + 1)
+            items = []
+            for seq in range(first_seq, self.seq + 1):
+                slot = (seq - 1) % self.max_frames
+                payload = self.frames[slot].copy() if self.storage == STORAGE_RAW else self.encoded[slot]
+                items.append((seq, float(self.timestamps[slot]), payload))
+
+        if self.storage == STORAGE_RAW:
+            encoded = []
+            for seq, ts, frame in items:
+                success, data = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+                if success:
+                    encoded.append((seq, ts, data.tobytes()))
+            return encoded
+        return items
+
+    def get_frames_between(
+        self,
+        start_time: float,
+        end_time: float,
+        stride: int = 1,
+        max_frames: Optional[int] = None,
+    ):
         """
         Returns decoded frames within a time window.
+
+        The window is located by binary search over the time-ordered ring.
+        `stride` keeps every n-th frame and `max_frames` caps the result by
+        sampling evenly across the window; only the kept frames are decoded.
+        """
+        with self.lock:
+            lo = self._search(start_time)
+            hi = self._search(end_time, right=True)
+            indices = self._sample(lo, hi, stride, max_frames)
+
+            first_seq = self.seq - min(self.seq, self.max_frames) + 1
+            relevant = []
+            for i in indices:
+                slot = (first_seq + i - 1) % self.max_frames
+                relevant.append((float(self.timestamps[slot]), self._stored(slot)))
+
+        return [(ts, self._materialize(stored)) for ts, stored in relevant]
+
+    def _search(self, value: float, right: bool = False) -> int:
+        """
+        Bisects the ring in time order. Returns the logical index (0 = oldest)
+        of the first frame with timestamp >= value (> value if `right`).
+        Caller holds the lock.
+        """
+        count = min(self.seq, self.max_frames)
+        first_seq = self.seq - count + 1
+
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ts = self.timestamps[(first_seq + mid - 1) % self.max_frames]
+            if ts < value or (right and ts == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def _sample(lo: int, hi: int, stride: int, max_frames: Optional[int]):
+        indices = range(lo, hi, max(1, stride))
+        if max_frames is not None and len(indices) > max_frames:
+            if max_frames <= 0:
+                return []
+            if max_frames == 1:
+                return [indices[0]]
+            # Evenly spaced, always keeping the first and last frame of the window
+            step = (len(indices) - 1) / (max_frames - 1)
+            return [indices[round(k * step)] for k in range(max_frames)]
+        return list(indices)
+
+    def decode_cache_stats(self):
+        with self.lock:
+            return {
+                "size": len(self.decoded),
+                "capacity": self.decode_cache_size,
+                "hits": self.decode_hits,
+                "misses": self.decode_misses,
+            }
+
+    def _stored(self, slot: int):
         """
-        frames = []
+        Snapshot of a slot as (seq, payload, dims). Caller holds the lock.
+        """
+        seq = int(self.seqs[slot])
+        if self.storage == STORAGE_RAW:
+            view = self.frames[slot].view()
+            view.flags.writeable = False
+            return seq, view, None
+        return seq, self.encoded[slot], tuple(self.dims[slot])
+
+    def _materialize(self, stored):
+        """
+        Turns a stored slot into a frame.
+
+        Raw views are returned as-is (zero-copy): they stay valid until the
+        ring wraps around, so copy them if they must outlive `max_frames`
+        newer frames. Compressed slots are decoded once and memoized; the
+        memoized array is shared, so it is read-only too.
+        """
+        seq, payload, dims = stored
+        if self.storage == STORAGE_RAW:
+            return payload
 
         with self.lock:
-            relevant = [
-                (ts, fb) for ts, fb in self.buffer
-                if start_time <= ts <= end_time
-            ]
-
-        for ts, frame_bytes in relevant:
-            frame = cv2.imdecode(
-                np.frombuffer(frame_bytes, np.uint8),
-                cv2.IMREAD_COLOR
-            )
-            frames.append((ts, frame))
-
-        return frames
+            frame = self.decoded.get(seq)
+            if frame is not None:
+                self.decoded.move_to_end(seq)
+                self.decode_hits += 1
+                return frame
+            self.decode_misses += 1
+
+        with timed("frame_decode"):
+            frame = self._decode(payload, dims, self.frame_size)
+        if frame is None:
+            return None
+        frame.flags.writeable = False
+
+        if self.decode_cache_size > 0:
+            with self.lock:
+                self.decoded[seq] = frame
+                while len(self.decoded) > self.decode_cache_size:
+                    self.decoded.popitem(last=False)
+        return frame
+
+    @staticmethod
+    def _decode(frame_bytes: bytes, dims=None, target_size=None):
+        """
+        Decodes a JPEG. When the source is at least 2x the target size the
+        decoder downscales while decoding (1/2, 1/4, 1/8), which is much cheaper
+        than a full-size decode followed by a resize.
+        """
+        flag = cv2.IMREAD_COLOR
+        if dims is not None and target_size is not None:
+            factor = min(dims[0] // target_size[0], dims[1] // target_size[1])
+            if factor >= 8:
+                flag = cv2.IMREAD_REDUCED_COLOR_8
+            elif factor >= 4:
+                flag = cv2.IMREAD_REDUCED_COLOR_4
+            elif factor >= 2:
+                flag = cv2.IMREAD_REDUCED_COLOR_2
+
+        frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), flag)
+        if frame is not None and target_size is not None and frame.shape[1::-1] != tuple(target_size):
+            frame = cv2.resize(frame, target_size)
+        return frame
+
+
+class FrameSubscription:
+    """
+    Per-consumer cursor over a FrameBuffer.
+    Remembers the last sequence number handed out so `wait` only returns
+    frames the consumer has not seen yet.
+    """
+
+    def __init__(self, frame_buffer: FrameBuffer):
+        self.frame_buffer = frame_buffer
+        self.last_seq = frame_buffer.latest_seq
+        self.skipped = 0
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Blocks for the next unseen frame. Returns (seq, timestamp, frame) or None.
+        """
+        data = self.frame_buffer.wait_for_frame(self.last_seq, timeout)
+        if data is None:
+            return None
+
+        return self._advance(data)
+
+    async def wait_async(self, timeout: Optional[float] = None):
+        """
+        Awaitable version of `wait`. The cursor only moves once the frame is
+        returned, so a cancelled wait does not lose a frame.
+        """
+        data = await self.frame_buffer.wait_for_frame_async(self.last_seq, timeout)
+        if data is None:
+            return None
+        return self._advance(data)
+
+    def _advance(self, data):
+        seq = data[0]
+        self.skipped += max(0, seq - self.last_seq - 1)
+        self.last_seq = seq
+        return data
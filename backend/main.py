@@ -1,31 +1,61 @@
 from fastapi import FastAPI, APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 # from detection import detect_objects
 # from summarization import create_summary
 # from storage import add_event, query_events
 # from utils import decode_image
-from websocket import socket_router, frame_buffer, processed_buffer
-from vision_worker import VisionWorker
-import datetime, uvicorn, threading, asyncio
+from websocket import socket_router, camera_registry
+from scheduler import InferenceScheduler
+from process_worker import ProcessInferenceScheduler
+import metrics
+from detector import create_detector
+import datetime, uvicorn, threading, asyncio, os, functools
 from contextlib import asynccontextmanager
 
 
+# Size of the inference thread pool shared by all cameras
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Cross-camera micro-batching: max frames per detector call and how long to wait to fill a batch
+INFERENCE_BATCH_SIZE = int(os.environ.get("INFERENCE_BATCH_SIZE", 4))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get("INFERENCE_BATCH_WAIT_MS", 10))
+# "thread" runs vision work in this process, "process" moves it to supervised child processes
+VISION_WORKER_MODE = os.environ.get("VISION_WORKER_MODE", "thread")
+# "ultralytics", "onnx" (ONNX Runtime on CPU) or "stub"; DETECTOR_MODEL overrides the backend's default weights
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "ultralytics")
+DETECTOR_MODEL = os.environ.get("DETECTOR_MODEL")
+# ONNX only: load a dynamically quantized INT8 copy of the model, and cap the threads per session
+DETECTOR_INT8 = os.environ.get("DETECTOR_INT8", "0") == "1"
+DETECTOR_THREADS = int(os.environ.get("DETECTOR_THREADS", 0)) or None
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Start the YOLO worker in a background thread
-    worker = VisionWorker(frame_buffer, processed_buffer)
-    thread = threading.Thread(target=worker.run, daemon=True)
-    thread.start()
+    # Start the shared YOLO worker pool (threads, or child processes fed through shared memory)
+    scheduler_cls = ProcessInferenceScheduler if VISION_WORKER_MODE == "process" else InferenceScheduler
+    scheduler = scheduler_cls(
+        camera_registry,
+        num_workers=INFERENCE_WORKERS,
+        # partial over a module-level function stays picklable for process mode
+        detector_factory=functools.partial(
+            create_detector, DETECTOR_BACKEND, model=DETECTOR_MODEL, int8=DETECTOR_INT8, threads=DETECTOR_THREADS
+        ),
+        max_batch_size=INFERENCE_BATCH_SIZE,
+        max_wait=INFERENCE_BATCH_WAIT_MS / 1000,
+    )
+    # Returns immediately: models load and warm up in the workers, /api/ready flips when done
+    scheduler.start()
+    app.state.scheduler = scheduler
     
-    print("[INFO] YOLO Worker started")
+    print(f"[INFO] {DETECTOR_BACKEND} scheduler started with {INFERENCE_WORKERS} {VISION_WORKER_MODE} workers")
     
     yield  # Application runs here
     
-    print("[INFO] Lifespan ending — cleanup if needed")
-    # If you had cleanup logic, join threads or release resources here
+    print("[INFO] Lifespan ending — stopping inference workers")
+    # Joins worker threads; in process mode also shuts down children and frees shared memory
+    scheduler.stop()
+    camera_registry.close()
 
 
 
@@ -42,17 +72,57 @@ app.add_middleware(
 
 router = APIRouter()
 
-app.include_router(router, prefix="/api")
-app.include_router(socket_router, prefix="/ws")
-
 @router.get("/health")
 async def health():
     return JSONResponse(content={"status": "healthy"})
 
+@router.get("/ready")
+async def ready():
+    # 200 only once a detector has completed its warm-up inference
+    scheduler = app.state.scheduler
+    content = {"ready": scheduler.is_ready(), "detector": DETECTOR_BACKEND, "load_error": scheduler.load_error}
+    return JSONResponse(content=content, status_code=200 if content["ready"] else 503)
+
 @router.get("/tasks")
 async def tasks():
     return JSONResponse(content={"tasks": [f"Task: {task.get_name()}, Done: {task.done()}"] for task in asyncio.all_tasks() })
 
+@router.get("/cameras")
+async def cameras():
+    return JSONResponse(content={"cameras": camera_registry.stats()})
+
+@router.get("/scheduler")
+async def scheduler_stats():
+    return JSONResponse(content=app.state.scheduler.stats())
+
+@router.get("/chunk_requests")
+async def chunk_requests(since: float = 0.0):
+    # VLM chunk requests from every camera's trigger engine, oldest first
+    requests = [r for camera in camera_registry.cameras() for r in camera.triggers.recent(since)]
+    requests.sort(key=lambda r: r["end"])
+    return JSONResponse(content={"requests": requests})
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    # Stage latency and frame age histograms plus per-camera counters, in Prometheus text format
+    cameras = camera_registry.cameras()
+    extra = metrics.counter_lines(
+        "cctv_vlm_calls_avoided_total", "VLM calls a fixed sliding window would have made that the triggers skipped.",
+        "camera", {camera.camera_id: camera.triggers.stats()["vlm_calls_avoided"] for camera in cameras},
+    ) + metrics.counter_lines(
+        "cctv_frames_processed_total", "Frames that went through the vision worker.", "camera",
+        {camera.camera_id: camera.processed for camera in cameras},
+    ) + metrics.counter_lines(
+        "cctv_frames_dropped_total", "Frames skipped because a newer one arrived first.", "camera",
+        {camera.camera_id: camera.dropped for camera in cameras},
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+
+# Routers must be included after their routes are declared
+app.include_router(router, prefix="/api")
+app.include_router(socket_router, prefix="/ws")
+
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
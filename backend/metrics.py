@@ -0,0 +1,149 @@
+import time
+import bisect
+import threading
+from typing import Dict, Sequence
+
+
+# Upper bounds in seconds; stages range from sub-millisecond copies to YOLO on CPU
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Frame age (now - capture timestamp) at points along the live path
+AGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram sharded per thread. Each thread writes only its
+    own shard, so `observe` takes no lock; readers sum the shards. A reader
+    may see a shard mid-update, which is fine for monitoring.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self._new_shard()
+        # Counts per bucket, then +Inf, then the running sum
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def _new_shard(self):
+        shard = [0] * (len(self.buckets) + 1) + [0.0]
+        with self.lock:
+            self.shards.append(shard)
+        self.local.shard = shard
+        return shard
+
+    def snapshot(self):
+        """
+        Returns (cumulative bucket counts incl. +Inf, count, sum).
+        """
+        with self.lock:
+            shards = list(self.shards)
+
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in shards:
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, running, total
+
+
+class HistogramFamily:
+    """
+    Histograms sharing a name and buckets, one per value of a single label.
+    """
+
+    def __init__(self, name: str, help: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.children: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        child = self.children.get(value)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, child in sorted(self.children.items()):
+            cumulative, count, total = child.snapshot()
+            label = f'{self.label}="{value}"'
+            for bound, c in zip(self.buckets + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {c}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+STAGE_SECONDS = HistogramFamily(
+    "cctv_stage_seconds", "Time spent in each stage of the live video path.", "stage", LATENCY_BUCKETS
+)
+FRAME_AGE_SECONDS = HistogramFamily(
+    "cctv_frame_age_seconds", "Age of a frame since capture when it reaches a point of the live path.", "point", AGE_BUCKETS
+)
+
+
+class timed:
+    """
+    `with timed("encode"):` records the block's duration under that stage.
+    """
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, stage: str):
+        self.histogram = STAGE_SECONDS.labels(stage)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_age(point: str, timestamp: float):
+    """
+    Records how old a frame captured at `timestamp` (time.time()) is now.
+    """
+    FRAME_AGE_SECONDS.labels(point).observe(time.time() - timestamp)
+
+
+def counter_lines(name: str, help: str, label: str, values: Dict[str, float]):
+    """
+    Prometheus lines for a labelled counter whose values are kept elsewhere.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{{{label}="{key}"}} {value}')
+    return lines
+
+
+def render(extra_lines=()) -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = STAGE_SECONDS.render() + FRAME_AGE_SECONDS.render() + list(extra_lines)
+    return "\n".join(lines) + "\n"
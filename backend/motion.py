@@ -0,0 +1,74 @@
+import time
+from typing import Tuple
+
+import numpy as np
+import cv2
+
+
+class MotionGate:
+    """
+    Cheap pre-filter that decides whether a frame needs a detector pass.
+
+    Frames are downscaled to a small grayscale thumbnail and compared with a
+    running-average background. If fewer than `sensitivity` (a fraction of
+    pixels) changed by more than `pixel_threshold` levels, the frame counts as
+    static and detection can be skipped. A detection is still forced every
+    `refresh_seconds` so tracks cannot go stale forever.
+    """
+
+    def __init__(
+        self,
+        sensitivity: float = 0.01,
+        pixel_threshold: int = 25,
+        refresh_seconds: float = 5.0,
+        size: Tuple[int, int] = (96, 54),
+        learning_rate: float = 0.05,
+    ):
+        self.sensitivity = sensitivity
+        self.pixel_threshold = pixel_threshold
+        self.refresh_seconds = refresh_seconds
+        self.size = size
+        self.learning_rate = learning_rate
+
+        self.background = None
+        self.last_detect = 0.0
+
+        self.checked = 0
+        self.skipped = 0
+        self.gate_time = 0.0
+        self.last_changed = 0.0
+
+    def should_detect(self, frame: np.ndarray, timestamp: float) -> bool:
+        start = time.perf_counter()
+
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (3, 3), 0)
+
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            motion = True
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            self.last_changed = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            motion = self.last_changed >= self.sensitivity
+            cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        detect = motion or timestamp - self.last_detect >= self.refresh_seconds
+        if detect:
+            self.last_detect = timestamp
+
+        self.checked += 1
+        if not detect:
+            self.skipped += 1
+        self.gate_time += time.perf_counter() - start
+        return detect
+
+    def stats(self):
+        return {
+            "sensitivity": self.sensitivity,
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_fraction": self.skipped / self.checked if self.checked else 0.0,
+            "gate_time_s": self.gate_time,
+            "last_changed_fraction": self.last_changed,
+        }
@@ -7,10 +7,25 @@ class ProcessedFrameBuffer:
     def __init__(self, max_frames: int = 10):
         self.buffer = deque(maxlen=max_frames)
         self.lock = threading.Lock()
+        self.listeners = []
+        # Bumped on every add; snapshots are cached per n until it changes
+        self.generation = 0
+        self.snapshots = {}
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(frame_bytes, timestamp)` to be called for every added frame.
+        """
+        self.listeners.append(callback)
 
     def add(self, frame_bytes: bytes, timestamp: float):
         with self.lock:
             self.buffer.append((timestamp, frame_bytes))
+            self.generation += 1
+            self.snapshots.clear()
+
+        for callback in self.listeners:
+            callback(frame_bytes, timestamp)
 
     def get_latest(self):
         with self.lock:
@@ -19,13 +34,30 @@ class ProcessedFrameBuffer:
             return self.buffer[-1]
         
     def get_n_evenly_spaced(self, n: int = 3):
+        _, items = self.snapshot(n)
+        return [frame_bytes for _, frame_bytes in items]
+
+    def snapshot(self, n: int = 3):
+        """
+        Returns (generation, [(timestamp, frame_bytes)]) with up to n evenly
+        spaced frames, oldest first. Repeated calls for the same n between two
+        adds return the cached list.
+        """
         with self.lock:
-            total = len(self.buffer)
-            if total == 0:
-                return []
-            if total <= n:
-                return [frame_bytes for _, frame_bytes in self.buffer]
-
-            # calculate evenly spaced indices
-            indices = [int(i * (total - 1) / (n - 1)) for i in range(n)]
-            return [self.buffer[0][1], self.buffer[total//2][1], self.buffer[-1][1]]
+            cached = self.snapshots.get(n)
+            if cached is None:
+                cached = self.snapshots[n] = (self.generation, self._evenly_spaced(n))
+            return cached
+
+    def _evenly_spaced(self, n: int):
+        # Caller holds the lock
+        total = len(self.buffer)
+        if total == 0 or n <= 0:
+            return []
+        if total <= n:
+            return list(self.buffer)
+        if n == 1:
+            return [self.buffer[-1]]
+
+        indices = [round(i * (total - 1) / (n - 1)) for i in range(n)]
+        return [self.buffer[i] for i in indices]
@@ -0,0 +1,336 @@
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from camera_registry import Camera, CameraRegistry
+from detector import Detector, YOLODetector
+from scheduler import InferenceScheduler
+from metrics import observe_age, observe_stage
+
+
+class SharedFrameSlots:
+    """
+    Fixed number of same-shaped uint8 slots in one shared memory block.
+    The creating side owns (and unlinks) the block; other processes attach by name.
+    """
+
+    def __init__(self, num_slots: int, slot_shape: Tuple[int, ...], name: Optional[str] = None):
+        self.num_slots = num_slots
+        self.slot_shape = tuple(slot_shape)
+        self.owner = name is None
+
+        size = num_slots * int(np.prod(self.slot_shape))
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.slots = np.ndarray((num_slots,) + self.slot_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        # Drop the numpy view first, the buffer cannot be released while it is exported
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# First message a child sends once its detector has finished a warm-up inference
+_READY = "ready"
+
+
+class _SlotOutput:
+    """
+    Stands in for ProcessedFrameBuffer and TrackStream inside a child:
+    keeps the last encoded frame and track record so they can be sent back.
+    """
+
+    def __init__(self):
+        self.frame_bytes = None
+        self.record = None
+
+    def add(self, frame_bytes: bytes, timestamp: float):
+        self.frame_bytes = frame_bytes
+
+    def publish(self, record):
+        self.record = record
+
+
+def _vision_process_main(
+    detector_factory, tracker_factory, frame_name, output_name, num_slots, frame_shape, tasks, results
+):
+    """
+    Child process loop. The detector is built and warmed up first, then
+    _READY is sent. Each task is a list of
+    (slot, camera_id, seq, timestamp, detect, annotate); the frames are read
+    from the shared frame slots, only those with `detect` set go through the
+    detector (the rest reuse the last tracks), annotated JPEGs are written to
+    the matching output slots and (slot, nbytes, track_record) goes back.
+    Tracker state is kept per camera for the life of the process.
+    """
+    # Imported here so the parent can run without the tracker installed in thread mode
+    from vision_worker import VisionWorker
+
+    frames = SharedFrameSlots(num_slots, frame_shape, name=frame_name)
+    outputs = SharedFrameSlots(num_slots, (int(np.prod(frame_shape)),), name=output_name)
+    workers = {}
+
+    try:
+        detector = detector_factory()
+        detector.warmup((frame_shape[1], frame_shape[0]))
+        results.put(_READY)
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            results.put(_run_task(task, frames, outputs, detector, workers, VisionWorker, tracker_factory))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        frames.close()
+        outputs.close()
+
+
+def _run_task(task, frames, outputs, detector, workers, worker_cls, tracker_factory=None):
+    # Kept separate so no view into shared memory outlives the task
+    batch = [frames.slots[item[0]] for item in task]
+    to_detect = [frame for item, frame in zip(task, batch) if item[4]]
+    detections = iter(detector.detect_batch(to_detect) if to_detect else [])
+
+    done = []
+    for (slot, camera_id, seq, timestamp, detect, annotate), frame in zip(task, batch):
+        worker = workers.get(camera_id)
+        if worker is None:
+            sink = _SlotOutput()
+            worker = worker_cls(
+                None,
+                sink,
+                detector=detector,
+                camera_id=camera_id,
+                track_stream=sink,
+                tracker=tracker_factory() if tracker_factory else None,
+            )
+            workers[camera_id] = worker
+
+        worker.annotate = annotate
+        worker.output_buffer.frame_bytes = None
+        if detect:
+            worker.track_and_publish(frame, timestamp, next(detections), seq)
+        else:
+            worker.publish(frame, timestamp, seq)
+
+        data = worker.output_buffer.frame_bytes
+        nbytes = len(data) if data is not None and len(data) <= outputs.slots.shape[1] else 0
+        if nbytes:
+            outputs.slots[slot, :nbytes] = np.frombuffer(data, np.uint8)
+        done.append((slot, nbytes, worker.track_stream.record))
+
+    return done
+
+
+class VisionProcess:
+    """
+    One supervised child process plus the shared memory it reads frames from
+    and writes annotated JPEGs into. Restarted automatically if it dies.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        detector_factory: Callable[[], Detector],
+        num_slots: int,
+        frame_shape: Tuple[int, int, int],
+        tracker_factory: Optional[Callable[[], object]] = None,
+    ):
+        self.index = index
+        self.detector_factory = detector_factory
+        self.tracker_factory = tracker_factory
+        self.num_slots = num_slots
+        self.frame_shape = frame_shape
+        self.ctx = mp.get_context("spawn")
+        self.frames = SharedFrameSlots(num_slots, frame_shape)
+        self.outputs = SharedFrameSlots(num_slots, (int(np.prod(frame_shape)),))
+        self.process = None
+        self.restarts = 0
+        self.start()
+
+    def start(self):
+        # Fresh queues every time: a child killed mid-put can leave a queue unusable
+        self.tasks = self.ctx.Queue()
+        self.results = self.ctx.Queue()
+        self.process = self.ctx.Process(
+            target=_vision_process_main,
+            args=(
+                self.detector_factory,
+                self.tracker_factory,
+                self.frames.name,
+                self.outputs.name,
+                self.num_slots,
+                self.frame_shape,
+                self.tasks,
+                self.results,
+            ),
+            name=f"vision-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+
+    def restart(self):
+        print(f"[WARN] Vision process {self.index} died (exit code {self.process.exitcode}), restarting")
+        self.restarts += 1
+        self.start()
+
+    def wait_ready(self, should_stop: Callable[[], bool], poll: float = 0.5, max_backoff: float = 30.0) -> bool:
+        """
+        Blocks until the child has loaded and warmed up its detector. A child
+        that exits first is restarted, waiting twice as long each time (up to
+        `max_backoff` seconds). Returns False if `should_stop` turns true first.
+        """
+        backoff = poll
+        while not should_stop():
+            try:
+                if self.results.get(timeout=poll) == _READY:
+                    return True
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                print(
+                    f"[WARN] Vision process {self.index} exited during startup "
+                    f"(exit code {self.process.exitcode}), restarting in {backoff:.1f}s"
+                )
+                deadline = time.time() + backoff
+                while time.time() < deadline:
+                    if should_stop():
+                        return False
+                    time.sleep(min(poll, max(0.0, deadline - time.time())))
+                self.restarts += 1
+                self.start()
+                backoff = min(backoff * 2, max_backoff)
+        return False
+
+    def run(self, task, should_stop: Callable[[], bool], poll: float = 0.5):
+        """
+        Sends a task and waits for its result. Returns None if the child died
+        (it is restarted before returning) or the scheduler is stopping.
+        """
+        self.tasks.put(task)
+        while True:
+            try:
+                result = self.results.get(timeout=poll)
+                # A restarted child announces itself again; that is not a result
+                if result != _READY:
+                    return result
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self.restart()
+                    return None
+                if should_stop():
+                    return None
+
+    def close(self, timeout: float = 5.0):
+        if self.process is not None and self.process.is_alive():
+            self.tasks.put(None)
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+
+        self.frames.close()
+        self.outputs.close()
+
+
+class ProcessInferenceScheduler(InferenceScheduler):
+    """
+    InferenceScheduler whose workers run detection, tracking, drawing and
+    encoding in separate processes, keeping that CPU work off the GIL of the
+    FastAPI process. Frames and annotated JPEGs move through shared memory
+    slots; only slot numbers and timestamps are pickled.
+
+    Cameras are pinned to one worker so their tracker state stays in one process.
+    `detector_factory` and `tracker_factory` must be picklable (a class or
+    module-level function).
+    """
+
+    def __init__(
+        self,
+        registry: CameraRegistry,
+        num_workers: int = 2,
+        detector_factory: Optional[Callable[[], Detector]] = None,
+        max_batch_size: int = 4,
+        max_wait: float = 0.01,
+        frame_size: Tuple[int, int] = (640, 360),
+        tracker_factory: Optional[Callable[[], object]] = None,
+    ):
+        super().__init__(
+            registry,
+            num_workers=num_workers,
+            detector_factory=detector_factory or YOLODetector,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            affinity=True,
+            tracker_factory=tracker_factory,
+        )
+        width, height = frame_size
+        self.frame_shape = (height, width, 3)
+        self.processes: List[VisionProcess] = []
+
+    def stats(self):
+        stats = super().stats()
+        stats["mode"] = "process"
+        stats["restarts"] = sum(p.restarts for p in self.processes)
+        return stats
+
+    def _create_runner(self, index: int):
+        process = VisionProcess(
+            index, self.detector_factory, self.max_batch_size, self.frame_shape, self.tracker_factory
+        )
+        self.processes.append(process)
+        return process
+
+    def _warm_up(self, runner: VisionProcess) -> bool:
+        return runner.wait_ready(self.stop_event.is_set)
+
+    def _close_runner(self, runner: VisionProcess):
+        runner.close()
+
+    def _run_batch(self, runner: VisionProcess, batch: List[Camera]):
+        # Frames that failed to decode were already dropped, so every slot gets a frame
+        items = self._gather_frames(batch)
+        if not items:
+            return
+
+        task = []
+        for slot, (camera, seq, timestamp, frame) in enumerate(items):
+            observe_age("dequeued", timestamp)
+            np.copyto(runner.frames.slots[slot], frame)
+            # The motion gate runs here so static frames never reach the child's detector
+            detect = self._should_detect(camera, timestamp, frame)
+            task.append((slot, camera.camera_id, seq, timestamp, detect, camera.annotate))
+
+        detected = sum(1 for item in task if item[4])
+        start = time.perf_counter()
+        done = runner.run(task, self.stop_event.is_set)
+        if done is None:
+            return
+        # Per-stage histograms inside the child are not exported; time the round trip here
+        elapsed = time.perf_counter() - start
+        observe_stage("process_batch", elapsed)
+        if detected:
+            self._record_batch(detected, elapsed)
+
+        for (slot, nbytes, record), (camera, _, timestamp, _) in zip(done, items):
+            if record is not None:
+                camera.track_stream.publish(record)
+            if nbytes:
+                camera.processed_buffer.add(runner.outputs.slots[slot, :nbytes].tobytes(), timestamp)
+            observe_age("processed", timestamp)
+            camera.processed += 1
@@ -0,0 +1,320 @@
+import os
+import bisect
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from frame_buffer import FrameBuffer
+
+
+# One index record per frame: where its JPEG lives in the segment's data file
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+class Segment:
+    """
+    One append-only pair of files: `<start_ms>.seg` holds JPEG bytes back to
+    back, `<start_ms>.idx` holds an INDEX_DTYPE record per frame. Index records
+    are written after their data, so a record never points past the data.
+    """
+
+    def __init__(self, directory: str, start_ms: int):
+        self.start_ms = start_ms
+        self.data_path = os.path.join(directory, f"{start_ms:013d}.seg")
+        self.index_path = os.path.join(directory, f"{start_ms:013d}.idx")
+        self.count = 0
+        self.size = 0
+        self.first_ts = None
+        self.last_ts = None
+        self._index = None
+        self._index_count = -1
+
+    @property
+    def nbytes(self) -> int:
+        return self.size + self.count * INDEX_DTYPE.itemsize
+
+    def recover(self):
+        """
+        Drops a torn tail left by a crash: partial index records, records
+        pointing past the data file and data bytes no record points to.
+        """
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+
+        count = index_size // INDEX_DTYPE.itemsize
+        records = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count) if count else np.zeros(0, INDEX_DTYPE)
+        ends = records["offset"] + records["length"]
+        valid = int(np.searchsorted(ends > data_size, True)) if count else 0
+        end = int(ends[valid - 1]) if valid else 0
+
+        if valid * INDEX_DTYPE.itemsize != index_size:
+            os.truncate(self.index_path, valid * INDEX_DTYPE.itemsize)
+        if end != data_size:
+            os.truncate(self.data_path, end)
+
+        self.count = valid
+        self.size = end
+        if valid:
+            self.first_ts = float(records["timestamp"][0])
+            self.last_ts = float(records["timestamp"][valid - 1])
+
+    def index(self) -> np.ndarray:
+        """
+        Memory-mapped view of the index, remapped only when frames were appended.
+        """
+        if self._index_count != self.count:
+            if self.count == 0:
+                self._index = np.zeros(0, INDEX_DTYPE)
+            else:
+                self._index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(self.count,))
+            self._index_count = self.count
+        return self._index
+
+    def delete(self):
+        self._index = None
+        for path in (self.data_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SegmentRecorder:
+    """
+    Disk-backed recording for one camera.
+
+    Frames spilled from a FrameBuffer are appended to rolling segment files
+    under `root/camera_id/`. Time-range reads bisect the segment list and
+    then each segment's memory-mapped index. Retention deletes whole segments,
+    oldest first, once the camera exceeds `max_bytes` or `max_age_seconds`.
+    On startup existing segments are recovered and new frames go to a fresh one.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        camera_id: str,
+        segment_seconds: float = 60,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_bytes: Optional[int] = 2 * 1024 * 1024 * 1024,
+        max_age_seconds: Optional[float] = 24 * 3600,
+        fsync: bool = False,
+    ):
+        self.camera_id = camera_id
+        self.directory = os.path.join(root, camera_id)
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.fsync = fsync
+
+        self.lock = threading.Lock()
+        self.segments: List[Segment] = []
+        self.active: Optional[Segment] = None
+        self._data_file = None
+        self._index_file = None
+
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.last_seq = 0
+        self.lost = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+
+    def _recover(self):
+        # Anything that is not <start_ms>.seg/.idx is not ours; leave it alone
+        starts = {
+            int(name[:-4]) for name in os.listdir(self.directory)
+            if (name.endswith(".idx") or name.endswith(".seg")) and name[:-4].isdigit()
+        }
+        for start_ms in sorted(starts):
+            segment = Segment(self.directory, start_ms)
+            segment.recover()
+            if segment.count:
+                self.segments.append(segment)
+            else:
+                segment.delete()
+
+    # ---- writing ----
+
+    def append(self, timestamp: float, frame_bytes: bytes):
+        """
+        Appends one JPEG. Rolls to a new segment by duration/size and applies retention.
+        """
+        with self.lock:
+            if self.active is None or self._should_roll(timestamp):
+                self._roll(timestamp)
+
+            segment = self.active
+            offset = segment.size
+            self._data_file.write(frame_bytes)
+            self._data_file.flush()
+
+            record = np.array([(timestamp, offset, len(frame_bytes))], dtype=INDEX_DTYPE)
+            self._index_file.write(record.tobytes())
+            self._index_file.flush()
+            if self.fsync:
+                os.fsync(self._data_file.fileno())
+                os.fsync(self._index_file.fileno())
+
+            segment.size += len(frame_bytes)
+            segment.count += 1
+            if segment.first_ts is None:
+                segment.first_ts = timestamp
+            segment.last_ts = timestamp
+
+    def _should_roll(self, timestamp: float) -> bool:
+        segment = self.active
+        return (
+            segment.size >= self.segment_bytes
+            or (segment.first_ts is not None and timestamp - segment.first_ts >= self.segment_seconds)
+        )
+
+    def _roll(self, timestamp: float):
+        # Caller holds the lock
+        self._close_files()
+
+        start_ms = int(timestamp * 1000)
+        if self.segments and start_ms <= self.segments[-1].start_ms:
+            start_ms = self.segments[-1].start_ms + 1
+
+        self.active = Segment(self.directory, start_ms)
+        self.segments.append(self.active)
+        self._data_file = open(self.active.data_path, "ab")
+        self._index_file = open(self.active.index_path, "ab")
+
+        self._apply_retention(timestamp)
+
+    def _apply_retention(self, now: float):
+        # Caller holds the lock; the active segment is never deleted
+        total = sum(segment.nbytes for segment in self.segments)
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            too_old = (
+                self.max_age_seconds is not None
+                and oldest.last_ts is not None
+                and oldest.last_ts < now - self.max_age_seconds
+            )
+            if not (too_big or too_old):
+                break
+            total -= oldest.nbytes
+            oldest.delete()
+            self.segments.pop(0)
+
+    def _close_files(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = None
+        self._index_file = None
+
+    # ---- spilling from a FrameBuffer ----
+
+    def start(self, frame_buffer: FrameBuffer):
+        """
+        Starts a background thread that appends every frame stored in `frame_buffer`.
+        """
+        self.last_seq = frame_buffer.latest_seq
+        self.thread = threading.Thread(
+            target=self._spill_loop, args=(frame_buffer,), name=f"recorder-{self.camera_id}", daemon=True
+        )
+        self.thread.start()
+
+    def _spill_loop(self, frame_buffer: FrameBuffer):
+        while not self.stop_event.is_set():
+            items = frame_buffer.get_encoded_after(self.last_seq, timeout=0.5)
+            for seq, timestamp, frame_bytes in items:
+                self.lost += max(0, seq - self.last_seq - 1)
+                self.last_seq = seq
+                try:
+                    self.append(timestamp, frame_bytes)
+                except OSError as e:
+                    print(f"[ERROR] Recorder {self.camera_id} failed to write: {e}")
+
+    def close(self, timeout: float = 5.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        with self.lock:
+            self._close_files()
+
+    # ---- reading ----
+
+    def get_encoded_between(
+        self,
+        start_time: float,
+        end_time: float,
+        stride: int = 1,
+        max_frames: Optional[int] = None,
+    ):
+        """
+        Returns [(timestamp, jpeg_bytes)] within a time window, sampled like
+        FrameBuffer.get_frames_between.
+        """
+        with self.lock:
+            segments = list(self.segments)
+            counts = [segment.count for segment in segments]
+
+        # Segments are time ordered: skip those that end before the window
+        starts = [segment.start_ms / 1000 for segment in segments]
+        first = max(0, bisect.bisect_right(starts, start_time) - 1)
+
+        hits = []
+        for segment, count in zip(segments[first:], counts[first:]):
+            if segment.first_ts is None or segment.first_ts > end_time:
+                break
+            if segment.last_ts < start_time:
+                continue
+
+            index = segment.index()[:count]
+            lo = int(np.searchsorted(index["timestamp"], start_time, side="left"))
+            hi = int(np.searchsorted(index["timestamp"], end_time, side="right"))
+            hits.extend((segment, index[i]) for i in range(lo, hi))
+
+        selected = FrameBuffer._sample(0, len(hits), stride, max_frames)
+
+        frames = []
+        open_files = {}
+        try:
+            for i in selected:
+                segment, record = hits[i]
+                f = open_files.get(segment.data_path)
+                if f is None:
+                    f = open_files[segment.data_path] = open(segment.data_path, "rb")
+                f.seek(int(record["offset"]))
+                frames.append((float(record["timestamp"]), f.read(int(record["length"]))))
+        except FileNotFoundError:
+            # Segment removed by retention while reading; return what was read
+            pass
+        finally:
+            for f in open_files.values():
+                f.close()
+
+        return frames
+
+    def get_frames_between(
+        self,
+        start_time: float,
+        end_time: float,
+        stride: int = 1,
+        max_frames: Optional[int] = None,
+    ):
+        """
+        Returns decoded frames within a time window, same shape as FrameBuffer.get_frames_between.
+        """
+        return [
+            (ts, FrameBuffer._decode(frame_bytes))
+            for ts, frame_bytes in self.get_encoded_between(start_time, end_time, stride, max_frames)
+        ]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "segments": len(self.segments),
+                "bytes": sum(segment.nbytes for segment in self.segments),
+                "frames": sum(segment.count for segment in self.segments),
+                "oldest": self.segments[0].first_ts if self.segments else None,
+                "newest": self.segments[-1].last_ts if self.segments else None,
+                "lost": self.lost,
+            }
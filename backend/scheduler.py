@@ -0,0 +1,343 @@
+import time
+import zlib
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from camera_registry import Camera, CameraRegistry
+from detector import Detector, YOLODetector
+from vision_worker import VisionWorker
+from metrics import observe_age, observe_stage
+
+
+class InferenceScheduler:
+    """
+    Shares a fixed pool of inference threads across all cameras.
+
+    Each camera is treated as a latest-only slot: when a worker picks it up
+    it takes the newest frame and everything older is dropped. Among cameras
+    that have a new frame and are within their FPS budget, the one served
+    least recently goes first, so a busy camera cannot starve the others.
+    A camera is only ever processed by one worker at a time, which keeps its
+    tracker state consistent. With `affinity=True` a camera is also always
+    served by the same worker.
+
+    Workers micro-batch across cameras: after claiming one camera they keep
+    claiming due cameras until `max_batch_size` is reached or `max_wait`
+    seconds have passed, run one batched detector call, and scatter the
+    detections back to each camera's tracker.
+    """
+
+    def __init__(
+        self,
+        registry: CameraRegistry,
+        num_workers: int = 2,
+        detector_factory: Optional[Callable[[], Detector]] = None,
+        max_batch_size: int = 4,
+        max_wait: float = 0.01,
+        affinity: bool = False,
+        tracker_factory: Optional[Callable[[], object]] = None,
+    ):
+        self.registry = registry
+        self.num_workers = max(1, num_workers)
+        self.detector_factory = detector_factory or YOLODetector
+        # None uses object_tracker's Tracker
+        self.tracker_factory = tracker_factory
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        # Pin every camera to one worker (needed when tracker state lives in that worker)
+        self.affinity = affinity
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+        # Set once the first worker has loaded its detector and finished a warm-up inference
+        self.ready_event = threading.Event()
+        self.started_at = None
+        self.ready_after = None
+        self.load_error = None
+
+        # Batch statistics (guarded by stats_lock)
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.batched_frames = 0
+        self.recent_latencies = deque(maxlen=256)
+        self.recent_sizes = deque(maxlen=256)
+        self.max_latency = 0.0
+
+    def start(self):
+        """
+        Starts the workers and returns immediately; detectors load and warm up
+        in the worker threads. Use `is_ready` to know when inference can run.
+        """
+        self.started_at = time.time()
+        self.registry.add_listener(self._watch_camera)
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop, args=(i,), name=f"inference-{i}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def is_ready(self) -> bool:
+        return self.ready_event.is_set()
+
+    def stats(self):
+        with self.stats_lock:
+            latencies = sorted(self.recent_latencies)
+            batched_in_window = sum(self.recent_sizes)
+            batches = self.batches
+            batched_frames = self.batched_frames
+            max_latency = self.max_latency
+
+        # Estimated detector time avoided by the motion gate, net of the gate's own cost
+        gates = [c.motion_gate for c in self.registry.cameras() if c.motion_gate is not None]
+        per_frame = sum(latencies) / batched_in_window if latencies and batched_in_window else 0.0
+        checked = sum(g.checked for g in gates)
+        skipped = sum(g.skipped for g in gates)
+
+        return {
+            "mode": "thread",
+            "ready": self.is_ready(),
+            "ready_after_s": self.ready_after,
+            "load_error": self.load_error,
+            "workers": self.num_workers,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "avg_batch_size": batched_frames / batches if batches else 0.0,
+            "batch_latency_ms": {
+                "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+                "max": max_latency * 1000,
+            },
+            "motion": {
+                "checked": checked,
+                "skipped": skipped,
+                "skip_fraction": skipped / checked if checked else 0.0,
+                "cpu_saved_s": max(0.0, skipped * per_frame - sum(g.gate_time for g in gates)),
+            },
+        }
+
+    def _watch_camera(self, camera: Camera):
+        camera.frame_buffer.add_listener(lambda seq: self._wake())
+        self._wake()
+
+    def _wake(self):
+        with self.cond:
+            if self.affinity:
+                # Any one worker would usually not own the camera, and the owner
+                # would then sleep until its wait timeout
+                self.cond.notify_all()
+            else:
+                self.cond.notify()
+
+    def _worker_for(self, camera: Camera) -> int:
+        return zlib.crc32(camera.camera_id.encode()) % self.num_workers
+
+    def _pick_due_camera(self, now: float, index: int):
+        """
+        Returns (best due camera or None, earliest future due time or None).
+        Must be called with self.cond held.
+        """
+        best = None
+        next_due = None
+
+        for camera in self.registry.cameras():
+            if self.affinity and self._worker_for(camera) != index:
+                continue
+            if camera.busy or camera.frame_buffer.latest_seq <= camera.last_seq:
+                continue
+            due = camera.last_run + camera.frame_interval
+            if due > now:
+                next_due = due if next_due is None else min(next_due, due)
+                continue
+            if best is None or camera.last_run < best.last_run:
+                best = camera
+
+        return best, next_due
+
+    def _acquire_batch(self, index: int) -> List[Camera]:
+        """
+        Blocks until some camera is due, then keeps claiming due cameras
+        until the batch is full or the batching deadline passes.
+        """
+        batch = []
+
+        with self.cond:
+            while not self.stop_event.is_set():
+                now = time.time()
+                camera, next_due = self._pick_due_camera(now, index)
+
+                if camera is not None:
+                    camera.busy = True
+                    camera.last_run = now
+                    batch.append(camera)
+                    break
+
+                self.cond.wait(next_due - now if next_due is not None else 0.5)
+
+            if not batch:
+                return batch
+
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch_size and not self.stop_event.is_set():
+                now = time.time()
+                camera, _ = self._pick_due_camera(now, index)
+
+                if camera is not None:
+                    camera.busy = True
+                    camera.last_run = now
+                    batch.append(camera)
+                    continue
+
+                if now >= deadline:
+                    break
+                self.cond.wait(deadline - now)
+
+        return batch
+
+    def _release_cameras(self, cameras: List[Camera]):
+        with self.cond:
+            for camera in cameras:
+                camera.busy = False
+            self.cond.notify_all()
+
+    def _create_runner(self, index: int):
+        """
+        Builds whatever a worker runs batches on. In-process workers own a detector.
+        """
+        return self.detector_factory()
+
+    def _warm_up(self, runner) -> bool:
+        """
+        Blocks until the runner has completed one warm-up inference.
+        Returns False if the scheduler was stopped first.
+        """
+        runner.warmup()
+        return True
+
+    def _close_runner(self, runner):
+        pass
+
+    def _worker_loop(self, index: int):
+        try:
+            runner = self._create_runner(index)
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"[ERROR] Inference worker {index} failed to load its detector: {e}")
+            return
+
+        try:
+            try:
+                if not self._warm_up(runner):
+                    return
+            except Exception as e:
+                self.load_error = str(e)
+                print(f"[ERROR] Inference worker {index} failed to warm up: {e}")
+                return
+
+            if not self.ready_event.is_set():
+                self.ready_after = time.time() - self.started_at
+                self.ready_event.set()
+                print(f"[INFO] Detector ready after {self.ready_after:.1f}s")
+
+            while not self.stop_event.is_set():
+                batch = self._acquire_batch(index)
+                if not batch:
+                    continue
+
+                try:
+                    self._run_batch(runner, batch)
+                except Exception as e:
+                    ids = ", ".join(camera.camera_id for camera in batch)
+                    print(f"[ERROR] Inference failed for cameras {ids}: {e}")
+                finally:
+                    self._release_cameras(batch)
+        finally:
+            self._close_runner(runner)
+
+    def _gather_frames(self, batch: List[Camera]):
+        """
+        Takes the newest frame of every claimed camera, counting skipped frames as dropped.
+        A passthrough frame that fails to decode is dropped too.
+        """
+        items = []
+        for camera in batch:
+            data = camera.frame_buffer.wait_for_frame(camera.last_seq, timeout=0)
+            if data is None:
+                continue
+
+            seq, timestamp, frame = data
+            camera.dropped += max(0, seq - camera.last_seq - 1)
+            camera.last_seq = seq
+            if frame is None:
+                camera.dropped += 1
+                continue
+            items.append((camera, seq, timestamp, frame))
+        return items
+
+    def _should_detect(self, camera: Camera, timestamp: float, frame) -> bool:
+        if camera.motion_gate is None:
+            return True
+        return camera.motion_gate.should_detect(frame, timestamp)
+
+    def _record_batch(self, size: int, latency: float):
+        with self.stats_lock:
+            self.batches += 1
+            self.batched_frames += size
+            self.recent_latencies.append(latency)
+            self.recent_sizes.append(size)
+            self.max_latency = max(self.max_latency, latency)
+
+    def _run_batch(self, detector: Detector, batch: List[Camera]):
+        items = self._gather_frames(batch)
+        if not items:
+            return
+        for _, _, timestamp, _ in items:
+            observe_age("dequeued", timestamp)
+
+        # Only frames with motion (or due a refresh) go to the detector
+        to_detect = [
+            item for item in items
+            if self._should_detect(item[0], item[2], item[3])
+        ]
+
+        detections = []
+        if to_detect:
+            # One detector call for the whole batch
+            start = time.perf_counter()
+            detections = detector.detect_batch([frame for _, _, _, frame in to_detect])
+            elapsed = time.perf_counter() - start
+            self._record_batch(len(to_detect), elapsed)
+            observe_stage("detect_batch", elapsed)
+
+        # Scatter detections back to each camera's tracker
+        detected = {id(item): d for item, d in zip(to_detect, detections)}
+        for item in items:
+            camera, seq, timestamp, frame = item
+            if camera.worker is None:
+                camera.worker = VisionWorker(
+                    camera.frame_buffer,
+                    camera.processed_buffer,
+                    detector=detector,
+                    camera_id=camera.camera_id,
+                    track_stream=camera.track_stream,
+                    annotate=camera.annotate,
+                    tracker=self.tracker_factory() if self.tracker_factory else None,
+                )
+
+            if id(item) in detected:
+                camera.worker.track_and_publish(frame, timestamp, detected[id(item)], seq)
+            else:
+                # Static scene: keep the last tracks instead of running the tracker on nothing
+                camera.worker.publish(frame, timestamp, seq)
+            camera.processed += 1
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from frame_buffer import STORAGE_RAW, FrameBuffer
+
+
+def make_buffer():
+    return FrameBuffer(max_seconds=1, target_fps=10, storage=STORAGE_RAW)
+
+
+def add_frame(buffer, value):
+    width, height = buffer.frame_size
+    buffer.add_frame(np.full((height, width, 3), value, np.uint8), time.time())
+
+
+def test_async_wait_returns_frame_added_later():
+    buffer = make_buffer()
+
+    async def main():
+        threading.Timer(0.05, add_frame, (buffer, 9)).start()
+        return await buffer.wait_for_frame_async(0, timeout=2.0, poll=0.02)
+
+    seq, _, frame = asyncio.run(main())
+    assert seq == 1
+    assert frame[0, 0, 0] == 9
+
+
+def test_async_wait_times_out():
+    buffer = make_buffer()
+    began = time.time()
+    assert asyncio.run(buffer.wait_for_frame_async(0, timeout=0.1, poll=0.02)) is None
+    assert time.time() - began < 1.0
+
+
+def test_cancelled_wait_frees_its_thread_and_keeps_the_frame():
+    buffer = make_buffer()
+    subscription = buffer.subscribe()
+
+    async def main():
+        task = asyncio.create_task(subscription.wait_async())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # The thread blocked in wait_for_frame gives up within one poll slice
+        await asyncio.sleep(0.5)
+        assert not buffer.new_frame._waiters
+
+        add_frame(buffer, 4)
+        return await subscription.wait_async(timeout=1.0)
+
+    seq, _, frame = asyncio.run(main())
+    assert seq == 1
+    assert subscription.last_seq == 1
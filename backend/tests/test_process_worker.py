@@ -0,0 +1,47 @@
+import functools
+import os
+
+import pytest
+
+from detector import StubDetector
+from process_worker import VisionProcess
+
+
+def flaky_detector(marker_dir, failures):
+    """Exits the child during startup until it has been started `failures` times"""
+    attempt = len(os.listdir(marker_dir))
+    open(os.path.join(marker_dir, str(attempt)), "w").close()
+    if attempt < failures:
+        os._exit(3)
+    return StubDetector()
+
+
+@pytest.fixture
+def process(tmp_path):
+    processes = []
+
+    def start(failures):
+        factory = functools.partial(flaky_detector, str(tmp_path), failures)
+        processes.append(VisionProcess(0, factory, num_slots=1, frame_shape=(36, 64, 3)))
+        return processes[-1]
+
+    yield start
+    for p in processes:
+        p.close()
+
+
+def test_child_that_dies_at_startup_is_restarted(process):
+    vision = process(failures=2)
+    assert vision.wait_ready(lambda: False, poll=0.05) is True
+    assert vision.restarts == 2
+
+
+def test_wait_ready_returns_false_when_stopped(process):
+    vision = process(failures=1000)
+    calls = []
+
+    def should_stop():
+        calls.append(1)
+        return len(calls) > 20
+
+    assert vision.wait_ready(should_stop, poll=0.05) is False
@@ -0,0 +1,158 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from camera_registry import CameraRegistry
+from detector import StubDetector
+from frame_buffer import STORAGE_PASSTHROUGH, STORAGE_RAW
+from scheduler import InferenceScheduler
+from tracks import StubTracker
+
+
+class RecordingDetector(StubDetector):
+    """StubDetector that records batch sizes and tags each box with its frame's fill value"""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def warmup(self, frame_size=(640, 360)):
+        super().warmup(frame_size)
+        self.batch_sizes.clear()
+
+    def detect_batch(self, frames):
+        self.batch_sizes.append(len(frames))
+        return [[[0, 0, 10, 10, float(frame[0, 0, 0])]] for frame in frames]
+
+
+class RecordingTracker(StubTracker):
+    def __init__(self):
+        super().__init__()
+        self.updates = []
+
+    def update(self, frame, detections):
+        self.updates.append(detections)
+        super().update(frame, detections)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def fill_frame(camera, value):
+    width, height = camera.frame_buffer.frame_size
+    camera.frame_buffer.add_frame(np.full((height, width, 3), value, np.uint8), time.time())
+
+
+def jpeg(camera, value):
+    width, height = camera.frame_buffer.frame_size
+    ok, data = cv2.imencode(".jpg", np.full((height, width, 3), value, np.uint8))
+    return data.tobytes()
+
+
+@pytest.fixture
+def setup():
+    registries = []
+    detector = RecordingDetector()
+    schedulers = []
+
+    def start(num_cameras, storage=STORAGE_RAW, **kwargs):
+        registry = CameraRegistry(storage=storage, annotate=False)
+        registries.append(registry)
+        cameras = [registry.get_or_create(f"cam{i}") for i in range(num_cameras)]
+        scheduler = InferenceScheduler(
+            registry, detector_factory=lambda: detector, tracker_factory=RecordingTracker, **kwargs
+        )
+        schedulers.append(scheduler)
+        return scheduler, cameras
+
+    yield start, detector
+    for scheduler in schedulers:
+        scheduler.stop()
+    for registry in registries:
+        registry.close()
+
+
+def test_batches_frames_from_all_cameras_into_one_call(setup):
+    start, detector = setup
+    scheduler, cameras = start(4, num_workers=1, max_batch_size=4, max_wait=0.2)
+    for i, camera in enumerate(cameras):
+        fill_frame(camera, 10 * (i + 1))
+
+    scheduler.start()
+    assert wait_until(lambda: all(camera.processed == 1 for camera in cameras))
+
+    assert detector.batch_sizes == [4]
+    assert scheduler.stats()["batches"] == 1
+
+
+def test_detections_are_scattered_back_to_their_camera(setup):
+    start, detector = setup
+    scheduler, cameras = start(3, num_workers=2, max_batch_size=3, max_wait=0.05)
+    scheduler.start()
+    assert wait_until(scheduler.is_ready)
+
+    for round_ in range(3):
+        for i, camera in enumerate(cameras):
+            fill_frame(camera, 10 * (i + 1) + round_)
+        assert wait_until(lambda: all(camera.processed == round_ + 1 for camera in cameras))
+
+    for i, camera in enumerate(cameras):
+        scores = [update[0][4] for update in camera.worker.tracker.updates]
+        assert scores == [10 * (i + 1) + round_ for round_ in range(3)]
+
+
+def test_batch_size_is_capped(setup):
+    start, detector = setup
+    scheduler, cameras = start(5, num_workers=1, max_batch_size=2, max_wait=0.2)
+    for i, camera in enumerate(cameras):
+        fill_frame(camera, i + 1)
+
+    scheduler.start()
+    assert wait_until(lambda: all(camera.processed == 1 for camera in cameras))
+
+    assert max(detector.batch_sizes) <= 2
+    assert sum(detector.batch_sizes) == 5
+
+
+def test_lone_frame_waits_at_most_max_wait(setup):
+    start, detector = setup
+    scheduler, cameras = start(2, num_workers=1, max_batch_size=8, max_wait=0.05)
+    scheduler.start()
+    assert wait_until(scheduler.is_ready)
+
+    began = time.time()
+    fill_frame(cameras[0], 7)
+    assert wait_until(lambda: cameras[0].processed == 1)
+    elapsed = time.time() - began
+
+    assert detector.batch_sizes[-1] == 1
+    assert elapsed < 0.5
+    assert cameras[1].processed == 0
+
+
+def test_undecodable_passthrough_frame_is_dropped(setup):
+    start, detector = setup
+    scheduler, cameras = start(1, storage=STORAGE_PASSTHROUGH, num_workers=1, max_wait=0.01)
+    camera = cameras[0]
+    scheduler.start()
+    assert wait_until(scheduler.is_ready)
+
+    # Valid markers and dimensions, but no scan data: stored, then fails to decode
+    good = jpeg(camera, 50)
+    broken = good[:good.index(b"\xff\xda")] + b"\xff\xd9"
+    assert camera.frame_buffer.add_encoded(broken, time.time())
+    assert wait_until(lambda: camera.dropped == 1)
+    assert camera.processed == 0
+
+    assert camera.frame_buffer.add_encoded(good, time.time())
+    assert wait_until(lambda: camera.processed == 1)
+    assert detector.batch_sizes == [1]
+    assert camera.dropped == 1
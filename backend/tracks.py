@@ -0,0 +1,87 @@
+import threading
+from collections import deque, namedtuple
+
+
+def make_track_record(camera_id, seq, timestamp, frame_size, tracks):
+    """
+    Compact per-frame track record shared by the websocket channel and
+    downstream consumers. `tracks` is the tracker's track list; boxes are in
+    the coordinates of the processed frame (`frame_size` = (width, height)).
+    """
+    return {
+        "type": "tracks",
+        "camera_id": camera_id,
+        "seq": seq,
+        "timestamp": timestamp,
+        "width": frame_size[0],
+        "height": frame_size[1],
+        "tracks": [
+            {
+                "id": int(track.track_id),
+                "bbox": [round(float(v), 1) for v in track.bbox],
+                "conf": _confidence(track),
+            }
+            for track in tracks
+        ],
+    }
+
+
+def _confidence(track):
+    # Not every tracker keeps the matched detection score on the track
+    conf = getattr(track, "confidence", None)
+    if conf is None:
+        conf = getattr(track, "conf", None)
+    return round(float(conf), 3) if conf is not None else None
+
+
+class TrackStream:
+    """
+    Per-camera stream of track records. Keeps the most recent `maxlen`
+    records for late readers and calls listeners for every new one, so
+    consumers such as event generation can follow tracks without the frames.
+    """
+
+    def __init__(self, maxlen: int = 600):
+        self.records = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(record)`, called from the publishing thread.
+        """
+        self.listeners.append(callback)
+
+    def publish(self, record):
+        with self.lock:
+            self.records.append(record)
+
+        for callback in self.listeners:
+            callback(record)
+
+    def latest(self):
+        with self.lock:
+            return self.records[-1] if self.records else None
+
+    def since(self, timestamp: float):
+        """
+        Records newer than `timestamp`, oldest first.
+        """
+        with self.lock:
+            return [r for r in self.records if r["timestamp"] > timestamp]
+
+
+StubTrack = namedtuple("StubTrack", ["track_id", "bbox", "confidence"])
+
+
+class StubTracker:
+    """
+    Deterministic stand-in for object_tracker's Tracker, for tests and
+    benchmarks: every detection becomes a track, numbered in detection order.
+    """
+
+    def __init__(self):
+        self.tracks = []
+
+    def update(self, frame, detections):
+        self.tracks = [StubTrack(i, det[:4], det[4]) for i, det in enumerate(detections)]
@@ -0,0 +1,236 @@
+import math
+import threading
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+
+TRIGGER_BIRTH = "track_birth"
+TRIGGER_DEATH = "track_death"
+TRIGGER_DISPLACEMENT = "displacement"
+TRIGGER_SPEED = "speed_change"
+TRIGGER_DWELL = "dwell"
+TRIGGER_PERIODIC = "periodic"
+
+
+class TrackState:
+    """
+    What the engine remembers about one live track.
+    """
+
+    def __init__(self, track_id: int, timestamp: float, bbox, maxlen: int):
+        self.track_id = track_id
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 0
+        self.born = False
+        # (timestamp, bbox) history, newest last
+        self.boxes = deque(maxlen=maxlen)
+        self.boxes.append((timestamp, bbox))
+
+        # State at the last emitted chunk request
+        self.last_trigger = None
+        self.anchor = _center(bbox)
+        self.anchor_speed = 0.0
+        self.dwell_reported = 0
+
+    def speed(self, window: float) -> float:
+        """
+        Center speed in pixels per second over roughly the last `window` seconds.
+        """
+        end_ts, end_box = self.boxes[-1]
+        for ts, box in self.boxes:
+            if end_ts - ts <= window:
+                break
+        if end_ts - ts <= 0:
+            return 0.0
+        return _distance(_center(box), _center(end_box)) / (end_ts - ts)
+
+
+class TriggerEngine:
+    """
+    Decides, per camera, when a VLM call is worth making.
+
+    Fed with the track records of a TrackStream. A chunk request (track id,
+    time window, sampled crop boxes) is emitted only when a track is born or
+    dies, moves more than `displacement` (fraction of the frame diagonal)
+    since its last request, changes speed by `speed_ratio`, stays longer than
+    another `dwell_seconds`, or has gone `refresh_seconds` without a request.
+    Non-terminal triggers respect a per-track `cooldown_seconds`.
+
+    To quantify the saving, the engine also counts the calls a fixed sliding
+    window would have made (one per live track every `baseline_seconds`).
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        min_hits: int = 3,
+        lost_seconds: float = 2.0,
+        displacement: float = 0.15,
+        speed_ratio: float = 2.0,
+        min_speed: float = 20.0,
+        dwell_seconds: float = 30.0,
+        refresh_seconds: float = 60.0,
+        cooldown_seconds: float = 2.0,
+        baseline_seconds: float = 6.0,
+        max_boxes: int = 8,
+        history: int = 256,
+    ):
+        self.camera_id = camera_id
+        self.min_hits = min_hits
+        self.lost_seconds = lost_seconds
+        self.displacement = displacement
+        self.speed_ratio = speed_ratio
+        self.min_speed = min_speed
+        self.dwell_seconds = dwell_seconds
+        self.refresh_seconds = refresh_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.baseline_seconds = baseline_seconds
+        self.max_boxes = max_boxes
+
+        self.lock = threading.Lock()
+        self.tracks: Dict[int, TrackState] = {}
+        self.requests = deque(maxlen=history)
+        self.listeners = []
+        self.last_timestamp = None
+
+        self.records = 0
+        self.track_seconds = 0.0
+        self.triggers = Counter()
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(request)`, called for every chunk request.
+        """
+        self.listeners.append(callback)
+
+    def on_record(self, record):
+        """
+        TrackStream listener. Runs on the publishing worker's thread.
+        """
+        timestamp = record["timestamp"]
+        diagonal = math.hypot(record["width"], record["height"])
+
+        with self.lock:
+            self.records += 1
+            if self.last_timestamp is not None and timestamp > self.last_timestamp:
+                self.track_seconds += (timestamp - self.last_timestamp) * len(self.tracks)
+            self.last_timestamp = timestamp
+
+            emitted = []
+            seen = set()
+            for track in record["tracks"]:
+                track_id = track["id"]
+                seen.add(track_id)
+                state = self.tracks.get(track_id)
+                if state is None:
+                    state = self.tracks[track_id] = TrackState(
+                        track_id, timestamp, track["bbox"], maxlen=max(64, self.max_boxes * 8)
+                    )
+                else:
+                    state.boxes.append((timestamp, track["bbox"]))
+                state.last_seen = timestamp
+                state.hits += 1
+
+                trigger = self._check(state, timestamp, diagonal)
+                if trigger is not None:
+                    emitted.append(self._request(state, trigger, timestamp))
+
+            for track_id in [t for t in self.tracks if t not in seen]:
+                state = self.tracks[track_id]
+                if timestamp - state.last_seen >= self.lost_seconds:
+                    del self.tracks[track_id]
+                    # Tracks that never got past min_hits were flicker, not worth a call
+                    if state.born:
+                        emitted.append(self._request(state, TRIGGER_DEATH, state.last_seen))
+
+        for request in emitted:
+            for callback in self.listeners:
+                callback(request)
+
+    def _check(self, state: TrackState, timestamp: float, diagonal: float) -> Optional[str]:
+        # Caller holds the lock
+        if not state.born:
+            if state.hits >= self.min_hits:
+                state.born = True
+                return TRIGGER_BIRTH
+            return None
+
+        if timestamp - state.last_trigger < self.cooldown_seconds:
+            return None
+
+        center = _center(state.boxes[-1][1])
+        if _distance(center, state.anchor) >= self.displacement * diagonal:
+            return TRIGGER_DISPLACEMENT
+
+        speed = state.speed(window=1.0)
+        fast, slow = max(speed, state.anchor_speed), min(speed, state.anchor_speed)
+        if fast >= self.min_speed and fast >= self.speed_ratio * max(slow, 1e-6):
+            return TRIGGER_SPEED
+
+        dwell_periods = int((timestamp - state.first_seen) // self.dwell_seconds)
+        if dwell_periods > state.dwell_reported:
+            return TRIGGER_DWELL
+
+        if timestamp - state.last_trigger >= self.refresh_seconds:
+            return TRIGGER_PERIODIC
+        return None
+
+    def _request(self, state: TrackState, trigger: str, timestamp: float):
+        # Caller holds the lock
+        start = state.first_seen if state.last_trigger is None or trigger == TRIGGER_DEATH else state.last_trigger
+        window = [(ts, box) for ts, box in state.boxes if start <= ts <= timestamp]
+        step = max(1, math.ceil(len(window) / self.max_boxes))
+        sampled = window[::step]
+        if window and sampled[-1] is not window[-1]:
+            sampled = sampled[: self.max_boxes - 1] + [window[-1]]
+
+        request = {
+            "type": "chunk_request",
+            "camera_id": self.camera_id,
+            "track_id": state.track_id,
+            "trigger": trigger,
+            "start": start,
+            "end": timestamp,
+            "boxes": [{"timestamp": ts, "bbox": box} for ts, box in sampled],
+        }
+
+        state.last_trigger = timestamp
+        state.anchor = _center(state.boxes[-1][1])
+        state.anchor_speed = state.speed(window=1.0)
+        state.dwell_reported = int((timestamp - state.first_seen) // self.dwell_seconds)
+
+        self.triggers[trigger] += 1
+        self.requests.append(request)
+        return request
+
+    def recent(self, since: float = 0.0) -> List[dict]:
+        """
+        Chunk requests whose window ended after `since`, oldest first.
+        """
+        with self.lock:
+            return [r for r in self.requests if r["end"] > since]
+
+    def stats(self):
+        with self.lock:
+            emitted = sum(self.triggers.values())
+            baseline = int(self.track_seconds // self.baseline_seconds)
+            avoided = max(0, baseline - emitted)
+            return {
+                "records": self.records,
+                "active_tracks": len(self.tracks),
+                "triggers": dict(self.triggers),
+                "chunk_requests": emitted,
+                "baseline_calls": baseline,
+                "vlm_calls_avoided": avoided,
+                "reduction": avoided / baseline if baseline else 0.0,
+            }
+
+
+def _center(bbox):
+    x1, y1, x2, y2 = bbox
+    return ((x1 + x2) / 2, (y1 + y2) / 2)
+
+
+def _distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
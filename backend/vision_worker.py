@@ -1,31 +1,38 @@
-import time
 import cv2
-from ultralytics import YOLO
-from object_tracker.tracker import Tracker  # Your existing tracker module
 
 from frame_buffer import FrameBuffer
 from output_buffer import ProcessedFrameBuffer
+from detector import Detector, YOLODetector
+from tracks import TrackStream, make_track_record
+from metrics import timed, observe_age
 
-import sys
-import os
-
-# Add object_tracker repo to path
-# sys.path.insert(0, os.path.join(os.path.dirname(__file__), "object_tracker"))
 
 class VisionWorker:
     def __init__(
         self,
         frame_buffer: FrameBuffer,
         output_buffer: ProcessedFrameBuffer,
-        target_fps: int = 10,
+        detector: Detector = None,
+        camera_id: str = None,
+        track_stream: TrackStream = None,
+        annotate: bool = True,
+        tracker=None,
     ):
         self.frame_buffer = frame_buffer
         self.output_buffer = output_buffer
-        self.model = YOLO("yolov8n.pt")
-        self.tracker = Tracker()
-        self.frame_interval = 1.0 / target_fps
-        self.last_run = 0
-        self.last_processed_frame = 0
+        self.camera_id = camera_id
+        # Receives a compact track record per processed frame
+        self.track_stream = track_stream
+        # Draw boxes and re-encode the frame for output_buffer (clients can overlay records instead)
+        self.annotate = annotate
+        # A detector can be shared in when several workers run off one pool
+        self.detector = detector if detector is not None else YOLODetector("yolov8n.pt")
+        if tracker is None:
+            # Imported lazily so benchmarks can run with a stub tracker and no tracker install
+            from object_tracker.tracker import Tracker  # Your existing tracker module
+
+            tracker = Tracker()
+        self.tracker = tracker
 
         # Colors for drawing different track IDs
         self.colors = [
@@ -38,39 +45,38 @@ class VisionWorker:
             (0, 255, 255),
         ]
 
-    def run(self):
-        while True:
-            now = time.time()
-
-            if now - self.last_run < self.frame_interval:
-                time.sleep(0.001)
-                continue
-
-            data = self.frame_buffer.get_latest_frame()
-            if data is None:
-                continue
-
-            timestamp, frame = data
-            self.last_run = now
-
-            if self.last_processed_frame == timestamp:
-                continue
-
-            self.last_processed_frame = timestamp
-            results = self.model(frame, verbose=False)
+    def track_and_publish(self, frame, timestamp: float, detections, seq: int = None):
+        """
+        Runs the tracker on one frame's detections, draws the tracks and
+        pushes the annotated JPEG to the output buffer.
+        """
+        # Update tracker with current frame detections
+        with timed("track"):
+            self.tracker.update(frame, detections)
+        self.publish(frame, timestamp, seq)
+
+    def publish(self, frame, timestamp: float, seq: int = None):
+        """
+        Publishes the tracker's current tracks as a track record and, when
+        `annotate` is on, draws them on the frame and pushes the annotated
+        JPEG to the output buffer. Called on its own for frames the motion
+        gate skipped, reusing the last tracker state.
+        """
+        if self.track_stream is not None:
+            self.track_stream.publish(
+                make_track_record(self.camera_id, seq, timestamp, frame.shape[1::-1], self.tracker.tracks)
+            )
 
-            detections = []
-            for r in results:
-                for box in r.boxes.data.tolist():
-                    x1, y1, x2, y2, conf, cls = box
-                    if int(cls) == 0 and conf > 0.5:
-                        x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
-                        detections.append([x1, y1, x2, y2, conf])
+        if not self.annotate:
+            observe_age("processed", timestamp)
+            return
 
-            # Update tracker with current frame detections
-            self.tracker.update(frame, detections)
+        # Raw-mode buffers hand out read-only views; draw on a private copy
+        if not frame.flags.writeable:
+            frame = frame.copy()
 
-            # Draw tracked boxes with IDs
+        # Draw tracked boxes with IDs
+        with timed("draw"):
             for track in self.tracker.tracks:
                 x1, y1, x2, y2 = track.bbox
                 track_id = track.track_id
@@ -87,9 +93,11 @@ class VisionWorker:
                     2,
                 )
 
-            # Encode frame and send to output buffer
+        # Encode frame and send to output buffer
+        with timed("encode"):
             success, encoded = cv2.imencode(
                 ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70]
             )
-            if success:
-                self.output_buffer.add(encoded.tobytes(), timestamp)
+        observe_age("processed", timestamp)
+        if success:
+            self.output_buffer.add(encoded.tobytes(), timestamp)
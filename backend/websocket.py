@@ -1,27 +1,68 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
-import numpy as np
-import cv2
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 import time
 import base64
+import json
 import asyncio
+import os
+from typing import Optional
 
-from frame_buffer import FrameBuffer
-from output_buffer import ProcessedFrameBuffer
+from camera_registry import CameraRegistry
+from metrics import timed, observe_age
 
 socket_router = APIRouter()
 
-frame_buffer = FrameBuffer(max_seconds=20, target_fps=10)
-processed_buffer = ProcessedFrameBuffer()
+DEFAULT_CAMERA = "default"
+
+# "jpeg" keeps long windows cheap in RAM, "raw" skips the codec round trip,
+# "passthrough" stores the browser's JPEG untouched and decodes only on demand
+FRAME_STORAGE = os.environ.get("FRAME_STORAGE", "jpeg")
+
+# Set to a directory to record every camera to disk beyond the in-memory window
+RECORDINGS_DIR = os.environ.get("RECORDINGS_DIR")
+
+# Fraction of changed pixels that counts as motion; "off" runs the detector on every frame
+MOTION_SENSITIVITY = os.environ.get("MOTION_SENSITIVITY", "0.01")
+
+# "0" stops drawing boxes and re-encoding frames server-side; clients overlay the track messages
+ANNOTATE_FRAMES = os.environ.get("ANNOTATE_FRAMES", "1") != "0"
+
+camera_registry = CameraRegistry(
+    default_fps=10,
+    max_seconds=20,
+    storage=FRAME_STORAGE,
+    recordings_dir=RECORDINGS_DIR,
+    motion_sensitivity=None if MOTION_SENSITIVITY == "off" else float(MOTION_SENSITIVITY),
+    annotate=ANNOTATE_FRAMES,
+)
 
 
 @socket_router.websocket("/video")
 async def video_websocket(websocket: WebSocket):
+    await camera_websocket(websocket, DEFAULT_CAMERA)
+
+
+@socket_router.websocket("/video/{camera_id}")
+async def camera_websocket(
+    websocket: WebSocket,
+    camera_id: str,
+    fps: Optional[float] = None,
+    motion: Optional[float] = None,
+):
+    try:
+        camera = camera_registry.get_or_create(camera_id, fps_budget=fps, motion_sensitivity=motion)
+    except ValueError as e:
+        print(f"[WS] Rejected connection: {e}")
+        await websocket.close(code=1008)
+        return
+    frame_buffer = camera.frame_buffer
+
     await websocket.accept()
 
-    sending_enabled = asyncio.Event()
+    # Viewers (including ones that never send frames) get processed frames via the broadcaster
+    mailbox = camera.broadcaster.subscribe()
     connected = True
-    print("[WS] Connected")
+    print(f"[WS] Connected camera={camera_id} client={mailbox.client_id}")
 
     async def receiver():
         try:
@@ -30,65 +71,123 @@ async def video_websocket(websocket: WebSocket):
                 print("\nReceiving\n")
                 frame_bytes = await websocket.receive_bytes()
 
-                sending_enabled.set()
-
-                frame = cv2.imdecode(
-                    np.frombuffer(frame_bytes, np.uint8),
-                    cv2.IMREAD_COLOR,
-                )
-                if frame is not None:
+                # Passthrough storage only validates the JPEG here; decoding is deferred
+                with timed("ws_ingest"):
+                    added = frame_buffer.add_encoded(frame_bytes, time.time())
+                if added:
                     print("\nFrame added\n")
-                    frame_buffer.add_frame(frame, time.time())
         except WebSocketDisconnect:
             print("\nRecieving Web Socket Disconnected\n")
             connected = False
-            sending_enabled.set()
-            pass
+            mailbox.close()
 
     async def sender():
         try:
             nonlocal connected
             while connected:
-                await sending_enabled.wait()
-
-                if not connected:
+                item = await mailbox.get()
+                if item is None:
                     print("\n Sending looped breaking\n")
                     break
 
-                print("\nSending...\n")
-                
-                item = processed_buffer.get_latest()
-                if item:
-                    timestamp, frame_bytes = item
-                    if time.time() - timestamp < 1.5:
-                        await websocket.send_bytes(frame_bytes)
-                        print("\nFrame sent\n")
-                    else:
-                        sending_enabled.clear()
+                kind, payload = item
+                if kind == "tracks":
+                    # Structured overlay data goes out as a JSON text message
+                    record, _ = payload
+                    await websocket.send_text(json.dumps(record))
+                    continue
 
-                await asyncio.sleep(0.1)  # ~10 FPS
+                timestamp, frame_bytes, published_at = payload
+                if time.time() - timestamp < 1.5:
+                    with timed("ws_send"):
+                        await websocket.send_bytes(frame_bytes)
+                    observe_age("sent", timestamp)
+                    mailbox.sent(published_at)
+                    print("\nFrame sent\n")
 
         except WebSocketDisconnect:
             print("\nSending Web Socket Disconnected\n")
         finally:
             connected = False
-            sending_enabled.clear()
 
     receive_task = asyncio.create_task(receiver())
     send_task = asyncio.create_task(sender())
 
-    done, pending = await asyncio.wait(
-        [receive_task, send_task],
-        return_when=asyncio.FIRST_EXCEPTION
-    )
+    try:
+        done, pending = await asyncio.wait(
+            [receive_task, send_task],
+            return_when=asyncio.FIRST_COMPLETED
+        )
+
+        for task in pending:
+            task.cancel()
+    finally:
+        camera.broadcaster.unsubscribe(mailbox)
+
 
-    for task in pending:
-        task.cancel()
 
+# Encoded snapshot responses per camera: (generation, newest, {(n, format): (etag, body, media_type)}).
+# Only the current generation is kept, so memory is bounded by cameras x 100 n x 2 formats.
+_snap_responses = {}
+SNAP_BOUNDARY = "snapframe"
 
 
 @socket_router.get("/get_snaps")
-async def video_websocket():
-    frames = processed_buffer.get_n_evenly_spaced(3)
-    frames_b64 = [base64.b64encode(f).decode("utf-8") for f in frames]
-    return JSONResponse({"snaps": frames_b64})
\ No newline at end of file
+async def get_snaps(request: Request, n: int = 3, format: str = "json"):
+    return await get_camera_snaps(request, DEFAULT_CAMERA, n, format)
+
+
+@socket_router.get("/get_snaps/{camera_id}")
+async def get_camera_snaps(request: Request, camera_id: str, n: int = 3, format: str = "json"):
+    """
+    Up to n evenly spaced processed frames. `format=json` returns base64 JPEGs,
+    `format=multipart` returns the raw JPEGs as multipart/mixed parts.
+    Responses carry an ETag that changes only when new frames arrive, so a
+    poll with a matching If-None-Match gets an empty 304.
+    """
+    if format not in ("json", "multipart"):
+        return JSONResponse({"error": "format must be json or multipart"}, status_code=400)
+
+    camera = camera_registry.get(camera_id)
+    if camera is None:
+        return JSONResponse({"snaps": []})
+
+    n = max(1, min(n, 100))
+    generation, items = camera.processed_buffer.snapshot(n)
+    newest = int(items[-1][0] * 1000) if items else 0
+    etag = f'"{camera_id}-{n}-{generation}-{newest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    entry = _snap_responses.get(camera_id)
+    if entry is None or entry[:2] != (generation, newest):
+        # New frames: every body for the older generation is stale
+        entry = _snap_responses[camera_id] = (generation, newest, {})
+    responses = entry[2]
+    cached = responses.get((n, format))
+    if cached is None:
+        if format == "json":
+            frames_b64 = [base64.b64encode(frame_bytes).decode("utf-8") for _, frame_bytes in items]
+            body = json.dumps({"snaps": frames_b64}).encode("utf-8")
+            media_type = "application/json"
+        else:
+            body = _multipart(items)
+            media_type = f"multipart/mixed; boundary={SNAP_BOUNDARY}"
+        cached = responses[(n, format)] = (etag, body, media_type)
+
+    return Response(content=cached[1], media_type=cached[2], headers=headers)
+
+
+def _multipart(items):
+    parts = []
+    for timestamp, frame_bytes in items:
+        parts.append(
+            f"--{SNAP_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+            f"Content-Length: {len(frame_bytes)}\r\nX-Timestamp: {timestamp}\r\n\r\n".encode("ascii")
+        )
+        parts.append(frame_bytes)
+        parts.append(b"\r\n")
+    parts.append(f"--{SNAP_BOUNDARY}--\r\n".encode("ascii"))
+    return b"".join(parts)
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# The pipeline's own results reader (standard library only), so the two never drift
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "VLM-pipeline"))
+from results_io import read_results
+
+
+class BulkIngester:
+    """Accumulates documents and writes them with `collection.upsert` in batches.
+
+    Each flush is one embedding call for the whole batch and one DB write, and
+    upsert makes re-ingesting the same IDs update them instead of failing.
+    If `embedding_function` is given the batch is embedded here (so embedding
+    and write time are reported separately); otherwise the collection embeds it.
+    """
+
+    def __init__(self, collection, batch_size=64, embedding_function=None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.embedding_function = embedding_function
+        self.pending = {}  # id -> (document, metadata); a repeated id keeps its latest version
+        self.documents = 0
+        self.batches = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self.started = None
+
+    def add(self, doc_id, document, metadata):
+        if self.started is None:
+            self.started = time.perf_counter()
+        self.pending[doc_id] = (document, metadata)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, docs):
+        """docs: iterable of (id, document, metadata)"""
+        for doc_id, document, metadata in docs:
+            self.add(doc_id, document, metadata)
+
+    def flush(self):
+        if not self.pending:
+            return 0
+        ids = list(self.pending)
+        documents = [self.pending[i][0] for i in ids]
+        metadatas = [self.pending[i][1] for i in ids]
+        self.pending = {}
+
+        embeddings = None
+        if self.embedding_function is not None:
+            start = time.perf_counter()
+            embeddings = self.embedding_function(documents)
+            self.embed_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        self.write_seconds += time.perf_counter() - start
+
+        self.documents += len(ids)
+        self.batches += 1
+        return len(ids)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            "documents": self.documents,
+            "batches": self.batches,
+            "batch_size": self.batch_size,
+            "seconds": round(elapsed, 3),
+            "docs_per_sec": round(self.documents / elapsed, 1) if elapsed else 0.0,
+            "embed_seconds": round(self.embed_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+# --- SCHEMAS: turn VLM output into (id, document, metadata) ---
+
+PERSON_TEXT = "At {time}, {description} was spotted {activity}."
+
+
+def person_documents(vlm_json, text=PERSON_TEXT, person_index=True):
+    """The per-frame `persons` schema: one document per person.
+    `text` is formatted with time, camera, description and activity."""
+    timestamp = vlm_json.get("timestamp", "unknown_time")
+    cam_id = vlm_json.get("camera_id", "cam_01")
+    for i, person in enumerate(vlm_json['persons']):
+        # A person's own "time" or "camera" key must not clash with the frame's
+        document = text.format(**{**person, "time": timestamp, "camera": cam_id})
+        metadata = {"time": timestamp, "camera": cam_id}
+        if person_index:
+            metadata["person_index"] = i
+        yield f"{cam_id}_{timestamp}_{i}", document, metadata
+
+
+def event_document(event, header=None, camera_id="cam_01"):
+    """One pipeline event (a described sliding window) as a document.
+
+    The ID comes from the window's frame range when the event has it, so the
+    same window ingested again, from any results file, updates one document.
+    """
+    header = header or {}
+    pred = event.get("json", {})
+    start = pred.get("timestamp_start", "unknown_time")
+    summary = pred.get("natural_summary") or event.get("summary", "")
+    text = f"At {start} on {camera_id}, {summary}."
+    if pred.get("activity"):
+        text += f" Activity: {pred['activity']}."
+
+    frames = event.get("frame_names")
+    if frames:
+        doc_id = f"{camera_id}_{frames[0]}_{frames[-1]}"
+    else:
+        doc_id = f"{camera_id}_{header.get('timestamp', 'run')}_{event['chunk_id']}"
+
+    metadata = {
+        "time": start,
+        "time_end": pred.get("timestamp_end"),
+        "camera": camera_id,
+        "track_id": pred.get("track_id"),
+        "event_id": pred.get("event_id"),
+        "chunk_id": event.get("chunk_id"),
+        "trigger": event.get("trigger"),
+        "activity": pred.get("activity"),
+        "direction": pred.get("direction"),
+        "scene": pred.get("scene"),
+        "confidence": pred.get("confidence"),
+        "tags": ",".join(pred.get("search_tags", [])),
+        "model": header.get("model"),
+        "run": header.get("timestamp"),
+    }
+    return doc_id, text, {k: v for k, v in metadata.items() if v is not None}
+
+
+def results_documents(path, camera_id="cam_01"):
+    header = {}
+    for record in read_results(path):
+        if record.get("type") == "header":
+            header = record
+        elif record.get("type") == "event":
+            yield event_document(record, header, camera_id)
+
+
+def ingest_results(paths, collection, batch_size=64, camera_id="cam_01", embedding_function=None):
+    """Bulk-ingests whole pipeline results files; returns the ingest stats.
+    Unreadable files (e.g. a dump cut short by a crash) are reported and skipped."""
+    skipped = []
+    with BulkIngester(collection, batch_size, embedding_function) as ingester:
+        for path in paths:
+            try:
+                # Documents are collected first so a bad file adds nothing
+                docs = list(results_documents(path, camera_id))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {path}: {e}")
+                skipped.append(str(path))
+                continue
+            ingester.add_many(docs)
+    stats = {**ingester.stats(), "skipped_files": skipped}
+    print(f"✅ Upserted {stats['documents']} logs in {stats['batches']} batches ({stats['docs_per_sec']} docs/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load VLM pipeline results into ChromaDB")
+    parser.add_argument("results", nargs="+", help="results/cctv_rag_pipeline_*.json[l] files")
+    parser.add_argument("--db", default="./security_memory")
+    parser.add_argument("--collection", default="vlm_logs")
+    parser.add_argument("--camera", default="cam_01")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    import chromadb
+    from chromadb.utils import embedding_functions
+
+    client = chromadb.PersistentClient(path=args.db)
+    emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    collection = client.get_or_create_collection(name=args.collection, embedding_function=emb_fn)
+    batch_size = min(args.batch_size, client.get_max_batch_size())
+    print(json.dumps(ingest_results(args.results, collection, batch_size, args.camera, emb_fn), indent=2))
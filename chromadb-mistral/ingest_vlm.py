@@ -1,6 +1,7 @@
 import chromadb
 from chromadb.utils import embedding_functions
 import json
+from bulk_ingest import BulkIngester, person_documents, ingest_results
 
 # 1. Initialize the Database (Saves to 'security_memory' folder)
 client = chromadb.PersistentClient(path="./security_memory")
@@ -12,27 +13,19 @@ emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="al
 # 3. Create a 'Collection' (Like a table in a database)
 collection = client.get_or_create_collection(name="vlm_logs", embedding_function=emb_fn)
 
-def save_json_to_db(vlm_json):
-    """Converts VLM JSON into searchable vector chunks."""
-    timestamp = vlm_json.get("timestamp", "unknown_time")
-    cam_id = vlm_json.get("camera_id", "cam_01")
+def save_json_to_db(vlm_json, batch_size=64):
+    """Converts VLM JSON into searchable vector chunks.
     
-    # We store each person as a separate 'document' so search is precise
-    for i, person in enumerate(vlm_json['persons']):
-        # FLATTENING: Turn JSON fields into a sentence the AI can 'understand'
-        searchable_text = f"At {timestamp}, {person['description']} was spotted {person['activity']}."
-        
-        # METADATA: Keep the raw data for filtering (not for searching)
-        metadata = {"time": timestamp, "camera": cam_id, "person_index": i}
-        
-        # SAVE: Push to ChromaDB
-        collection.add(
-            documents=[searchable_text],
-            metadatas=[metadata],
-            ids=[f"{cam_id}_{timestamp}_{i}"]
-        )
+    We store each person as a separate 'document' so search is precise;
+    they are embedded and upserted together, so re-saving a frame is safe."""
+    with BulkIngester(collection, batch_size) as ingester:
+        ingester.add_many(person_documents(vlm_json))
     print(f"Successfully stored {len(vlm_json['persons'])} logs in ChromaDB.")
 
+def save_results_to_db(*paths, batch_size=64):
+    """Ingests whole VLM pipeline result files (results/cctv_rag_pipeline_*.json[l])."""
+    return ingest_results(paths, collection, batch_size)
+
 # --- QUICK TEST: Run this to see if it saves properly ---
 if __name__ == "__main__":
     sample_data = {
@@ -1,7 +1,7 @@
 import chromadb
 from chromadb.utils import embedding_functions
 import json
-import time
+from bulk_ingest import BulkIngester, person_documents
 
 # --- STEP A: INITIALIZATION ---
 # Persistent storage ensures data stays on your disk
@@ -88,24 +88,16 @@ vlm_stream_simulation = [
 ]
 
 # --- STEP C: THE INGESTION ENGINE ---
-def simulate_ingestion(stream):
+SIMULATION_TEXT = "At {time} on {camera}, {description} was observed {activity}."
+
+def simulate_ingestion(stream, batch_size=64):
     print("--- STARTING DATA INGESTION SIMULATION ---")
-    for frame in stream:
-        ts = frame['timestamp']
-        cam = frame['camera_id']
-        
-        for i, person in enumerate(frame['persons']):
-            # 1. Flatten into text
-            doc_text = f"At {ts} on {cam}, {person['description']} was observed {person['activity']}."
-            
-            # 2. Assign unique ID and metadata
-            doc_id = f"{cam}_{ts}_{i}"
-            metadata = {"time": ts, "camera": cam}
-            
-            # 3. Store in Vector DB
-            collection.add(documents=[doc_text], metadatas=[metadata], ids=[doc_id])
-            print(f"✅ Stored Log: {doc_id}")
-            time.sleep(0.1) # Faster simulation delay
+    # Flatten every person into text + metadata, then embed and upsert in batches
+    with BulkIngester(collection, batch_size) as ingester:
+        for frame in stream:
+            ingester.add_many(person_documents(frame, SIMULATION_TEXT, person_index=False))
+    stats = ingester.stats()
+    print(f"✅ Stored {stats['documents']} logs in {stats['batches']} batches ({stats['docs_per_sec']} docs/s)")
     print("--- INGESTION COMPLETE ---\n")
 
 # --- STEP D: THE MISTRAL QUERY INTERFACE ---
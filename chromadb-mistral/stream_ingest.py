@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bulk_ingest import BulkIngester, event_document, read_results
+
+
+class IngestQueue:
+    """Crash-safe on-disk queue of documents waiting for ChromaDB (SQLite, WAL).
+
+    Tail offsets are stored in the same transaction as the documents read up
+    to them, so a restart neither skips nor re-queues lines. Documents are
+    only deleted after their upsert succeeded; a crash in between re-upserts
+    them, which is harmless.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, document TEXT NOT NULL,
+            metadata TEXT NOT NULL, produced REAL NOT NULL, enqueued REAL NOT NULL)""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS offsets (
+            file TEXT PRIMARY KEY, offset INTEGER NOT NULL)""")
+        self.db.commit()
+
+    def offset(self, file):
+        with self.lock:
+            row = self.db.execute("SELECT offset FROM offsets WHERE file = ?", (str(file),)).fetchone()
+        return row[0] if row else 0
+
+    def put(self, docs, produced, file=None, offset=None):
+        """Queues (id, document, metadata) entries and, atomically, the file's new offset"""
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO queue (doc_id, document, metadata, produced, enqueued) VALUES (?, ?, ?, ?, ?)",
+                [(doc_id, document, json.dumps(metadata), produced, now) for doc_id, document, metadata in docs],
+            )
+            if file is not None:
+                self.db.execute("INSERT OR REPLACE INTO offsets (file, offset) VALUES (?, ?)", (str(file), offset))
+            self.db.commit()
+
+    def peek(self, limit):
+        """Oldest `limit` entries as (row_id, doc_id, document, metadata, produced)"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, doc_id, document, metadata, produced FROM queue ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, doc_id, document, json.loads(metadata), produced)
+                for row_id, doc_id, document, metadata, produced in rows]
+
+    def ack(self, row_ids):
+        with self.lock:
+            self.db.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in row_ids])
+            self.db.commit()
+
+    def depth(self):
+        """(queued documents, enqueue time of the oldest one or None)"""
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*), MIN(enqueued) FROM queue").fetchone()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class ResultsTailer:
+    """Follows VLM pipeline output: one results file, or every results file in
+    a directory. New complete .jsonl lines are mapped to documents and queued;
+    a torn last line waits for the next poll. Old single-.json dumps are
+    queued once, whole. Documents carry the file's mtime as their produced time.
+    A file that fails to read or parse is logged and left at its old offset,
+    so it is retried once it changes; the other files keep flowing.
+    """
+
+    def __init__(self, source, queue, camera_id="cam_01", pattern="cctv_rag_pipeline_*"):
+        self.source = Path(source)
+        self.queue = queue
+        self.camera_id = camera_id
+        self.pattern = pattern
+        self.headers = {}
+        self.failed = {}  # path -> (size, mtime) of the version that failed
+
+    def files(self):
+        if self.source.is_dir():
+            return sorted(p for p in self.source.glob(self.pattern) if p.suffix in (".json", ".jsonl"))
+        return [self.source] if self.source.exists() else []
+
+    def poll(self):
+        """Reads what was appended since the last poll; returns the number of documents queued"""
+        queued = 0
+        for path in self.files():
+            try:
+                queued += self.poll_file(path)
+            except Exception as e:
+                try:
+                    st = path.stat()
+                    version = (st.st_size, st.st_mtime)
+                except OSError:
+                    version = None
+                if self.failed.get(path) != version:
+                    print(f"⚠️ Could not read {path}, will retry when it changes: {e!r}")
+                    self.failed[path] = version
+        return queued
+
+    def poll_file(self, path):
+        st = path.stat()
+        offset = self.queue.offset(path)
+        if st.st_size == offset or self.failed.get(path) == (st.st_size, st.st_mtime):
+            return 0
+        if st.st_size < offset:
+            print(f"⚠️ {path} shrank, reading it again from the start")
+            offset = 0
+
+        if path.suffix == ".json":
+            docs, header = self.documents(read_results(path), None)
+            self.queue.put(docs, st.st_mtime, path, st.st_size)
+            self.failed.pop(path, None)
+            self.headers[path] = header
+            return len(docs)
+
+        header = self.headers.get(path)
+        with open(path, 'rb') as f:
+            if offset and header is None:
+                header = json.loads(f.readline())
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return 0
+
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                print(f"⚠️ Skipping unreadable line in {path}")
+        docs, header = self.documents(records, header)
+        self.queue.put(docs, st.st_mtime, path, offset + end)
+        self.failed.pop(path, None)
+        self.headers[path] = header
+        return len(docs)
+
+    def documents(self, records, header):
+        """Maps records to documents; returns them with the file's (possibly new) header.
+        Nothing is kept until the caller has queued them, so a failure leaves no trace."""
+        docs = []
+        for record in records:
+            if record.get("type") == "header":
+                header = record
+            elif record.get("type") == "event":
+                docs.append(event_document(record, header, self.camera_id))
+        return docs, header
+
+
+class StreamIngestService:
+    """Background worker that drains the queue into a collection.
+
+    A batch is flushed when `batch_size` documents are queued or the oldest
+    has waited `max_delay` seconds. Freshness lag is the time from a
+    document's produced time until its upsert made it queryable.
+    """
+
+    def __init__(self, collection, queue, batch_size=64, max_delay=2.0, embedding_function=None):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.ingester = BulkIngester(collection, batch_size, embedding_function)
+        self.lags = deque(maxlen=1000)
+        self.last_flush = None
+        self.errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="stream-ingest", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        while self.flush():
+            pass
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            count, oldest = self.queue.depth()
+            if count and (count >= self.batch_size or time.time() - oldest >= self.max_delay):
+                try:
+                    self.flush()
+                except Exception as e:
+                    # Documents stay queued and are retried on the next pass
+                    self.errors += 1
+                    print(f"❌ Flush to ChromaDB failed: {e!r}")
+                    self.stop_event.wait(self.max_delay)
+                continue
+            wait = self.max_delay if not count else max(0.0, oldest + self.max_delay - time.time())
+            self.stop_event.wait(min(wait, 0.25))
+
+    def flush(self):
+        """Upserts the oldest batch, then removes it from the queue"""
+        rows = self.queue.peek(self.batch_size)
+        if not rows:
+            return 0
+        for _, doc_id, document, metadata, _ in rows:
+            self.ingester.add(doc_id, document, metadata)
+        self.ingester.flush()
+        self.queue.ack([row[0] for row in rows])
+
+        now = time.time()
+        self.lags.extend(now - row[4] for row in rows)
+        self.last_flush = now
+        print(f"✅ Ingested {len(rows)} logs, freshness lag {now - rows[0][4]:.2f}s")
+        return len(rows)
+
+    def stats(self):
+        count, oldest = self.queue.depth()
+        lags = sorted(self.lags)
+        return {
+            **self.ingester.stats(),
+            "queue_depth": count,
+            "oldest_queued_age_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "freshness_lag_p50_s": round(lags[len(lags) // 2], 3) if lags else 0.0,
+            "freshness_lag_p95_s": round(lags[int(len(lags) * 0.95)], 3) if lags else 0.0,
+            "freshness_lag_max_s": round(lags[-1], 3) if lags else 0.0,
+            "flush_errors": self.errors,
+        }
+
+    def metrics_text(self):
+        """Prometheus text exposition of stats()"""
+        s = self.stats()
+        lines = [
+            "# HELP ingest_documents_total Documents upserted into ChromaDB",
+            "# TYPE ingest_documents_total counter",
+            f"ingest_documents_total {s['documents']}",
+            "# HELP ingest_flush_errors_total Failed batch flushes",
+            "# TYPE ingest_flush_errors_total counter",
+            f"ingest_flush_errors_total {s['flush_errors']}",
+            "# HELP ingest_queue_depth Documents waiting in the on-disk queue",
+            "# TYPE ingest_queue_depth gauge",
+            f"ingest_queue_depth {s['queue_depth']}",
+            "# HELP ingest_oldest_queued_age_seconds Age of the oldest queued document",
+            "# TYPE ingest_oldest_queued_age_seconds gauge",
+            f"ingest_oldest_queued_age_seconds {s['oldest_queued_age_s']}",
+            "# HELP ingest_freshness_lag_seconds Time from VLM output to queryable, last 1000 documents",
+            "# TYPE ingest_freshness_lag_seconds summary",
+            f'ingest_freshness_lag_seconds{{quantile="0.5"}} {s["freshness_lag_p50_s"]}',
+            f'ingest_freshness_lag_seconds{{quantile="0.95"}} {s["freshness_lag_p95_s"]}',
+            f'ingest_freshness_lag_seconds{{quantile="1"}} {s["freshness_lag_max_s"]}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.server.service.metrics_text(), "text/plain; version=0.0.4"
+        elif self.path == "/stats":
+            body, content_type = json.dumps(self.server.service.stats()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(service, port=9105):
+    """/metrics (Prometheus) and /stats (JSON) for the ingest service, on a daemon thread"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    server.service = service
+    threading.Thread(target=server.serve_forever, name="ingest-metrics", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream VLM pipeline results into ChromaDB")
+    parser.add_argument("source", nargs="?", default="../VLM-pipeline/results",
+                        help="results directory or a single results .jsonl file")
+    parser.add_argument("--db", default="./security_memory")
+    parser.add_argument("--collection", default="vlm_logs")
+    parser.add_argument("--queue", default="./ingest_queue.sqlite")
+    parser.add_argument("--camera", default="cam_01")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-delay", type=float, default=2.0, help="seconds a document may wait for a batch")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between checks for new output")
+    parser.add_argument("--metrics-port", type=int, default=int(os.environ.get("INGEST_METRICS_PORT", 9105)))
+    args = parser.parse_args()
+
+    import chromadb
+    from chromadb.utils import embedding_functions
+
+    client = chromadb.PersistentClient(path=args.db)
+    emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    collection = client.get_or_create_collection(name=args.collection, embedding_function=emb_fn)
+
+    queue = IngestQueue(args.queue)
+    tailer = ResultsTailer(args.source, queue, args.camera)
+    service = StreamIngestService(collection, queue, min(args.batch_size, client.get_max_batch_size()),
+                                  args.max_delay, emb_fn)
+    service.start()
+    serve_metrics(service, args.metrics_port)
+    print(f"📡 Tailing {args.source} → {args.collection}, metrics on :{args.metrics_port}/metrics")
+    try:
+        while True:
+            queued = tailer.poll()
+            if queued:
+                print(f"📥 Queued {queued} new logs")
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print("--- STOPPING, FLUSHING QUEUED LOGS ---")
+    finally:
+        service.stop()
+        queue.close()
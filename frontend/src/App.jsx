@@ -34,7 +34,8 @@ function App() {
     const section = document.getElementById("results-section");
     if (section) section.scrollIntoView({ behavior: "smooth" });
 
-    fetch("http://localhost:8000/ws/get_snaps")
+    // no-cache revalidates with the ETag, so an unchanged buffer costs a 304
+    fetch("http://localhost:8000/ws/get_snaps", { cache: "no-cache" })
       .then((res) => res.json())
       .then((data) => setFrames(data.snaps));
   };
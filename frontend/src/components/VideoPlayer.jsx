@@ -4,12 +4,14 @@ const WEBSOCKET_URL = "ws://localhost:8000/ws/video";
 export default function VideoPlayer() {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
+  const overlayRef = useRef(null);
   const wsRef = useRef(null);
   const intervalRef = useRef(null);
 
   const [videoUrl, setVideoUrl] = useState(null);
   const [isStreaming, setIsStreaming] = useState(false);
   const [receivedFrame, setReceivedFrame] = useState(null);
+  const [tracks, setTracks] = useState(null);
 
   function handleUpload(e) {
     const file = e.target.files[0];
@@ -27,6 +29,13 @@ export default function VideoPlayer() {
     wsRef.current.onopen = () => console.log("WebSocket connected");
 
     wsRef.current.onmessage = (event) => {
+      // Text messages carry track metadata, binary ones annotated JPEG frames
+      if (typeof event.data === "string") {
+        const message = JSON.parse(event.data);
+        if (message.type === "tracks") setTracks(message);
+        return;
+      }
+
       const bytes = new Uint8Array(event.data);
       const blob = new Blob([bytes], { type: "image/jpeg" });
       const url = URL.createObjectURL(blob);
@@ -42,6 +51,33 @@ export default function VideoPlayer() {
     return () => wsRef.current?.close();
   }, []);
 
+  /* ---------- Draw track boxes over the local video ---------- */
+  useEffect(() => {
+    const overlay = overlayRef.current;
+    const video = videoRef.current;
+    if (!overlay || !tracks) return;
+
+    // Boxes are in the coordinates of the frame the backend processed
+    const ctx = overlay.getContext("2d");
+    overlay.width = tracks.width;
+    overlay.height = tracks.height;
+    if (video?.videoWidth) {
+      ctx.drawImage(video, 0, 0, overlay.width, overlay.height);
+    } else {
+      ctx.clearRect(0, 0, overlay.width, overlay.height);
+    }
+
+    ctx.strokeStyle = "lime";
+    ctx.fillStyle = "lime";
+    ctx.lineWidth = 2;
+    ctx.font = "16px sans-serif";
+    for (const track of tracks.tracks) {
+      const [x1, y1, x2, y2] = track.bbox;
+      ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+      ctx.fillText(`ID ${track.id}`, x1, y1 - 5);
+    }
+  }, [tracks]);
+
   /* ---------- Send one frame ---------- */
   const sendFrame = () => {
     const video = videoRef.current;
@@ -123,6 +159,9 @@ export default function VideoPlayer() {
             className="received-frame video-placeholder"
           />
         </div>
+      ) : tracks ? (
+        // Backend is not annotating frames: draw its tracks over the local video
+        <canvas ref={overlayRef} className="received-frame video-placeholder" />
       ) : (
         <div className="video-placeholder">
           <p>Live Stream Feed</p>